@@ -8,8 +8,16 @@
         'receta_dev'
     ],
     'data': [
-        'views/copia_rec_model_views.xml',
         'security/ir.model.access.csv',
+        'data/ir_cron.xml',
+        'views/copia_rec_model_views.xml',
+        'views/copia_ficha_lote_views.xml',
+        'views/copia_ficha_log_views.xml',
+        'views/copia_ficha_indice_views.xml',
+        'views/copia_ficha_vinculo_views.xml',
+        'views/copia_ficha_importar_views.xml',
+        'views/copia_ficha_combinacion_views.xml',
+        'views/copia_ficha_temporada_views.xml',
     ],
     
     'installable': True,
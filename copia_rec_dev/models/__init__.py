@@ -1,2 +1,11 @@
 from . import copiaficha
+from . import copia_ficha_lote
+from . import copia_ficha_log
+from . import copia_ficha_indice
+from . import copia_ficha_vinculo
+from . import copia_ficha_importar
+from . import copia_ficha_temporada
 from . import receta
+from . import pt_mstr
+from . import copia_ficha_combinacion
+from . import product_template
@@ -0,0 +1,82 @@
+import threading
+from collections import OrderedDict
+
+# Cantidad maxima de componentes resueltos que se mantienen en memoria por proceso.
+TAMANO_CACHE_COMPONENTES = 10000
+
+
+class CacheComponentes:
+    """
+    Cache LRU de tamano acotado para los componentes nuevos resueltos por
+    _determinar_nuevo_componente, indexada por (base de datos, temporada,
+    pt_group, pt_part, generacion del grupo). La cache es de cada proceso; la
+    generacion de cada grupo (ver pt.mstr) invalida las entradas de los demas
+    procesos.
+    """
+
+    def __init__(self, tamano_maximo=TAMANO_CACHE_COMPONENTES):
+        self.tamano_maximo = tamano_maximo
+        self._datos = OrderedDict()
+        self._lock = threading.RLock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+
+    def contiene(self, clave):
+        """
+        Indica si la clave esta en la cache, sin afectar los contadores.
+        """
+        with self._lock:
+            return clave in self._datos
+
+    def obtener(self, clave):
+        """
+        Devuelve (encontrado, valor) y actualiza los contadores de aciertos y fallos.
+        """
+        with self._lock:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                self.aciertos += 1
+                return True, self._datos[clave]
+            self.fallos += 1
+            return False, None
+
+    def guardar(self, clave, valor):
+        """
+        Guarda un valor, desalojando el menos usado si se supera el tamano maximo.
+        """
+        with self._lock:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.tamano_maximo:
+                self._datos.popitem(last=False)
+                self.desalojos += 1
+
+    def invalidar(self, grupos=None):
+        """
+        Elimina las entradas de los grupos indicados, o todas si no se indican grupos.
+        """
+        with self._lock:
+            if grupos is None:
+                self._datos.clear()
+                return
+            for clave in [clave for clave in self._datos if clave[2] in grupos]:
+                del self._datos[clave]
+
+    def estadisticas(self):
+        """
+        Devuelve los contadores de uso de la cache.
+        """
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._datos),
+                'tamano_maximo': self.tamano_maximo,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'desalojos': self.desalojos,
+                'tasa_aciertos': self.aciertos / total if total else 0.0,
+            }
+
+
+cache_componentes = CacheComponentes()
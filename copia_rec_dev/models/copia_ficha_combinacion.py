@@ -0,0 +1,128 @@
+import logging
+
+from odoo import models, fields, api
+from odoo.tools import sql
+
+_logger = logging.getLogger(__name__)
+
+# Campos de product.template de los que depende el indice de combinaciones.
+CAMPOS_COMBINACION = {'default_code', 'pt_model', 'pt_part_type', 'pt_pm_code', 'x_numero_combinaciones'}
+
+
+class CopiaFichaCombinacion(models.Model):
+    _name = 'copia.ficha.combinacion'
+    _description = 'Indice de Combinaciones de Articulos'
+    _order = 'pt_model, default_code'
+    _rec_name = 'default_code'
+
+    product_tmpl_id = fields.Many2one('product.template', string="Articulo", required=True, ondelete='cascade', index=True)
+    default_code = fields.Char(string="Codigo", index=True, readonly=True)
+    pt_model = fields.Char(string="Modelo", index=True, readonly=True)
+    pt_part_type = fields.Char(string="Tipo", readonly=True)
+    pt_pm_code = fields.Char(string="Codigo P/M", readonly=True)
+    numero_combinaciones = fields.Integer(string="Numero de Combinaciones", readonly=True)
+
+    _sql_constraints = [
+        ('articulo_unico', 'unique(product_tmpl_id)', "El articulo ya esta en el indice de combinaciones."),
+    ]
+
+    def init(self):
+        """
+        Crea el indice parcial de la busqueda de destinos compatibles (articulos
+        terminados y manufacturados por numero de combinaciones) y recalcula
+        el indice de combinaciones.
+        """
+        nombre = 'copia_ficha_combinacion_destino_idx'
+        if not sql.index_exists(self.env.cr, nombre):
+            sql.create_index(
+                self.env.cr, nombre, self._table, ['numero_combinaciones', 'default_code'],
+                where="pt_part_type LIKE 'PT-%' AND pt_pm_code = 'M'",
+            )
+        self._recalcular()
+
+    @api.model
+    def _recalcular(self, plantillas_ids=None):
+        """
+        Recalcula el indice con una sola sentencia desde product.template, para
+        todos los articulos o solo para los indicados: borra las filas de los
+        articulos que ya no tienen codigo e inserta o actualiza las demas. El
+        numero de combinaciones se toma de 'x_numero_combinaciones' (solo sus digitos).
+        """
+        plantilla = self.env['product.template']
+        plantilla.flush_model([campo for campo in CAMPOS_COMBINACION if campo in plantilla._fields])
+        self.flush_model()
+        combinaciones = "NULL"
+        if 'x_numero_combinaciones' in plantilla._fields:
+            combinaciones = "NULLIF(regexp_replace(p.x_numero_combinaciones::text, '[^0-9]', '', 'g'), '')::integer"
+        filtro, params = "", {'uid': self.env.uid}
+        if plantillas_ids is not None:
+            filtro, params['ids'] = "AND p.id = ANY(%(ids)s)", list(plantillas_ids)
+        self.env.cr.execute(f"""
+            WITH sin_codigo AS (
+                DELETE FROM {self._table} c
+                 USING {plantilla._table} p
+                 WHERE p.id = c.product_tmpl_id AND p.default_code IS NULL {filtro}
+            )
+            INSERT INTO {self._table} (product_tmpl_id, default_code, pt_model, pt_part_type, pt_pm_code,
+                                       numero_combinaciones, create_uid, create_date, write_uid, write_date)
+            SELECT p.id, p.default_code, p.pt_model, p.pt_part_type, p.pt_pm_code, {combinaciones},
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+              FROM {plantilla._table} p
+             WHERE p.default_code IS NOT NULL {filtro}
+            ON CONFLICT (product_tmpl_id) DO UPDATE SET
+                default_code = EXCLUDED.default_code,
+                pt_model = EXCLUDED.pt_model,
+                pt_part_type = EXCLUDED.pt_part_type,
+                pt_pm_code = EXCLUDED.pt_pm_code,
+                numero_combinaciones = EXCLUDED.numero_combinaciones,
+                write_uid = EXCLUDED.write_uid,
+                write_date = EXCLUDED.write_date
+        """, params)
+        _logger.info("Indice de combinaciones: %s articulos recalculados", self.env.cr.rowcount)
+        self.invalidate_model()
+
+    @api.model
+    def _cron_recalcular(self):
+        self._recalcular()
+
+    @api.model
+    def numero_combinaciones(self, codigos):
+        """
+        Devuelve un diccionario codigo -> numero de combinaciones con una sola
+        consulta. Si varios articulos tienen el mismo codigo se usa el primero.
+        """
+        combinaciones = {}
+        for fila in self.search_read([('default_code', 'in', list(codigos))], ['default_code', 'numero_combinaciones'], order='id'):
+            combinaciones.setdefault(fila['default_code'], fila['numero_combinaciones'])
+        return combinaciones
+
+    @api.model
+    def buscar_destinos_compatibles(self, part_o, temporada=None):
+        """
+        Devuelve con una sola consulta los articulos destino validos para el
+        articulo origen: mismo numero de combinaciones, tipo 'PT-',
+        manufacturados y sin ficha tecnica para la temporada (por defecto la
+        vigente). Cada destino es un diccionario con id, default_code, pt_model y
+        numero_combinaciones, una sola vez por codigo. Si varios articulos tienen
+        el codigo origen se usa el primero, como en numero_combinaciones.
+        """
+        if temporada is None:
+            temporada = self.env['receta']._temporada_actual().code_value
+        self.flush_model()
+        self.env['ps.mstr'].flush_model(['ps_domain', 'ps_par', 'ps_ref'])
+        self.env.cr.execute(f"""
+            SELECT DISTINCT ON (d.pt_model, d.default_code) d.id, d.default_code, d.pt_model, d.numero_combinaciones
+              FROM {self._table} d
+             WHERE d.numero_combinaciones = (
+                   SELECT o.numero_combinaciones FROM {self._table} o
+                    WHERE o.default_code = %(part_o)s ORDER BY o.id LIMIT 1
+               )
+               AND d.default_code != %(part_o)s
+               AND d.pt_part_type LIKE 'PT-%%' AND d.pt_pm_code = 'M'
+               AND NOT EXISTS (
+                   SELECT 1 FROM {self.env['ps.mstr']._table} ps
+                    WHERE ps.ps_domain = 'global_domain' AND ps.ps_par = d.default_code AND ps.ps_ref = %(temporada)s
+               )
+             ORDER BY d.pt_model, d.default_code, d.id
+        """, {'part_o': part_o, 'temporada': temporada})
+        return self.env.cr.dictfetchall()
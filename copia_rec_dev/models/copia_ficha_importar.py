@@ -0,0 +1,247 @@
+import base64
+import csv
+import io
+import tempfile
+import time
+
+from psycopg2 import Error as ErrorBaseDatos
+
+from odoo import models, fields
+from odoo.exceptions import UserError, ValidationError
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+# Columnas del archivo de importacion; part_d (vacio en las copias de numeraciones),
+# m_modelo_o y m_modelo_d son opcionales.
+COLUMNAS_IMPORTACION = ('part_o', 'part_d', 'm_numero_color', 'm_modelo_o', 'm_modelo_d')
+COLUMNAS_OBLIGATORIAS = ('part_o', 'm_numero_color')
+
+# Columnas del archivo de resultado; la duracion se completa cuando el lote termina.
+COLUMNAS_RESULTADO = ('fila', 'part_o', 'part_d', 'estado', 'duracion', 'mensaje')
+
+# Valores del archivo que se interpretan como verdadero en m_numero_color.
+VALORES_VERDADEROS = {'1', 'x', 's', 'si', 'sí', 'true', 'verdadero', 'yes'}
+
+# Filas por bloque por defecto.
+TAMANO_BLOQUE_DEFECTO = 100
+
+
+class CopiaFichaImportar(models.TransientModel):
+    _name = 'copia.ficha.importar'
+    _description = 'Importar Copias de Ficha Tecnica'
+
+    archivo = fields.Binary(string="Archivo (CSV o XLSX)", required=True, attachment=True)
+    nombre_archivo = fields.Char(string="Nombre del Archivo")
+    modo = fields.Selection([
+        ('ejecutar', 'Ejecutar en la cola'),
+        ('cargar', 'Solo cargar en un lote'),
+    ], string="Modo", default='ejecutar', required=True,
+        help="Ejecutar en la cola: las copias validas quedan en cola y el cron las procesa en segundo plano. "
+             "Solo cargar: las copias quedan en el lote en borrador para encolarlas despues.")
+    tamano_bloque = fields.Integer(string="Filas por Bloque", default=TAMANO_BLOQUE_DEFECTO)
+    lote_id = fields.Many2one('copia.ficha.lote', string="Lote", readonly=True)
+    resumen = fields.Text(string="Resumen", readonly=True)
+    archivo_resultado = fields.Binary(string="Resultado", readonly=True, attachment=False)
+    nombre_resultado = fields.Char(string="Nombre del Resultado")
+
+    def action_importar(self):
+        """
+        Lee el archivo fila a fila y carga las copias por bloques en un lote:
+        cada bloque se valida con las mismas consultas en su propio savepoint,
+        por lo que un error en una fila no deshace las anteriores. Las copias no
+        se ejecutan en la peticion: quedan en la cola del cron (o en borrador).
+        El resultado de cada fila queda en un CSV que se guarda tambien en el
+        lote, donde se actualiza con el estado, la duracion y el mensaje final
+        de cada copia cuando el lote termina.
+        """
+        self.ensure_one()
+        tamano_bloque = max(self.tamano_bloque, 1)
+        self.lote_id = self.env['copia.ficha.lote'].create({'name': f"Importacion {self.nombre_archivo or ''}".strip()})
+        conteo = dict.fromkeys(('en_cola', 'borrador', 'error'), 0)
+        inicio = time.perf_counter()
+
+        with tempfile.TemporaryFile(mode='w+', newline='', encoding='utf-8') as resultado:
+            escritor = csv.writer(resultado)
+            escritor.writerow(COLUMNAS_RESULTADO)
+            bloque = []
+            for fila in self._filas_archivo():
+                bloque.append(fila)
+                if len(bloque) >= tamano_bloque:
+                    self._procesar_bloque(bloque, escritor, conteo)
+                    bloque = []
+            if bloque:
+                self._procesar_bloque(bloque, escritor, conteo)
+
+            resultado.seek(0)
+            archivo_resultado = base64.b64encode(resultado.read().encode('utf-8'))
+            self.lote_id.write({
+                'archivo_resultado': archivo_resultado,
+                'nombre_resultado': 'resultado_importacion_copias.csv',
+            })
+            self.write({
+                'archivo_resultado': archivo_resultado,
+                'nombre_resultado': 'resultado_importacion_copias.csv',
+                'resumen': (
+                    f"{conteo['en_cola']} copias en cola, {conteo['borrador']} cargadas sin ejecutar y "
+                    f"{conteo['error']} con error en {time.perf_counter() - inicio:.2f} s. "
+                    f"El resultado con la duracion de cada copia se actualiza en el lote cuando termina."
+                ),
+            })
+        if conteo['en_cola']:
+            self.lote_id.estado = 'en_cola'
+            self.env.ref('copia_rec_dev.ir_cron_copia_ficha_cola')._trigger()
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+    def _procesar_bloque(self, bloque, escritor, conteo):
+        """
+        Carga las copias de un bloque de filas en un savepoint y escribe su
+        resultado. Si el bloque falla, se deshace solo ese bloque y sus filas
+        quedan con error en el resultado.
+        """
+        try:
+            with self.env.cr.savepoint():
+                resultados = self._cargar_bloque(bloque)
+        except (ValidationError, UserError, ErrorBaseDatos) as e:
+            resultados = {numero: ('error', f"Error al cargar el bloque: {str(e)}") for numero, fila in bloque}
+
+        for numero, fila in bloque:
+            estado, mensaje = resultados[numero]
+            conteo[estado] += 1
+            escritor.writerow([numero, fila.get('part_o'), fila.get('part_d'), estado, '', mensaje])
+
+# Vaciar la cache entre bloques para que la memoria no crezca con el archivo.
+        self.env.invalidate_all()
+
+    def _cargar_bloque(self, bloque):
+        """
+        Crea y valida las copias de un bloque de filas y deja en cola las validas
+        (en el modo 'ejecutar'). Devuelve un diccionario numero de fila -> (estado, mensaje).
+        """
+        articulos = self._buscar_articulos({
+            fila[campo] for numero, fila in bloque for campo in ('part_o', 'part_d') if fila.get(campo)
+        })
+        resultados = {}
+        vals_por_fila = {}
+        for numero, fila in bloque:
+            m_numero_color = str(fila.get('m_numero_color') or '').strip().lower() in VALORES_VERDADEROS
+# En la copia de numeraciones el articulo destino va vacio.
+            campos = ('part_o', 'part_d') if fila.get('part_d') or not m_numero_color else ('part_o',)
+            faltantes = [fila.get(campo) or campo for campo in campos if fila.get(campo) not in articulos]
+            if faltantes:
+                resultados[numero] = ('error', f"Articulo no encontrado: {', '.join(faltantes)}")
+                continue
+            vals_por_fila[numero] = {
+                'lote_id': self.lote_id.id,
+                'sequence': numero,
+                'part_o': articulos[fila['part_o']],
+                'part_d': articulos.get(fila.get('part_d')) or False,
+                'm_numero_color': m_numero_color,
+                'm_modelo_o': fila.get('m_modelo_o') or False,
+                'm_modelo_d': fila.get('m_modelo_d') or False,
+            }
+
+        fichas = self._crear_fichas(vals_por_fila, resultados)
+        errores = fichas._validar_lote()
+        for ficha in fichas:
+            if ficha.id in errores:
+                ficha.write({'estado': 'error', 'mensaje': f"Error de validación: {errores[ficha.id]}"})
+            elif self.modo == 'ejecutar':
+                ficha.write({'estado': 'en_cola', 'mensaje': "En cola."})
+            resultados[ficha.sequence] = (ficha.estado, ficha.mensaje or '')
+        return resultados
+
+    def _crear_fichas(self, vals_por_fila, resultados):
+        """
+        Crea las copias del bloque con una sola creacion multiple en un savepoint.
+        Si falla (restricciones del modelo o de la base de datos) se crean fila a
+        fila, cada una en su savepoint, y el error queda en el resultado de la fila.
+        """
+        ficha = self.env['copia.ficha']
+        try:
+            with self.env.cr.savepoint():
+                return ficha.create(list(vals_por_fila.values()))
+        except (ValidationError, UserError, ErrorBaseDatos):
+            pass
+        fichas = ficha.browse()
+        for numero, vals in vals_por_fila.items():
+            try:
+                with self.env.cr.savepoint():
+                    fichas |= ficha.create(vals)
+            except (ValidationError, UserError, ErrorBaseDatos) as e:
+                resultados[numero] = ('error', f"Error al crear la copia: {str(e)}")
+        return fichas
+
+    def _buscar_articulos(self, codigos):
+        """
+        Devuelve un diccionario codigo -> id de cl.product.articulo con una sola consulta.
+        """
+        if not codigos:
+            return {}
+        campo = self.env['copia.ficha']._campo_codigo_articulo()
+        return {
+            fila[campo]: fila['id']
+            for fila in self.env['cl.product.articulo'].search_read([(campo, 'in', list(codigos))], [campo])
+        }
+
+    def _filas_archivo(self):
+        """
+        Recorre el archivo fila a fila y entrega (numero de fila, valores por
+        columna). Los XLSX se leen en modo solo lectura de openpyxl.
+        """
+        with self._abrir_archivo() as archivo:
+            if (self.nombre_archivo or '').lower().endswith('.xlsx'):
+                if openpyxl is None:
+                    raise UserError("Para importar archivos XLSX se necesita la libreria openpyxl.")
+                libro = openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+                try:
+                    filas = libro.active.iter_rows(values_only=True)
+                    yield from self._filas_con_encabezado(filas)
+                finally:
+                    libro.close()
+            else:
+                texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+                try:
+                    dialecto = csv.Sniffer().sniff(texto.readline(), delimiters=',;\t')
+                except csv.Error:
+                    dialecto = csv.excel
+                texto.seek(0)
+                yield from self._filas_con_encabezado(csv.reader(texto, dialecto))
+                texto.detach()
+
+    def _filas_con_encabezado(self, filas):
+        encabezado = [str(columna or '').strip().lower() for columna in next(filas, ())]
+        faltantes = [columna for columna in COLUMNAS_OBLIGATORIAS if columna not in encabezado]
+        if faltantes:
+            raise UserError(f"Faltan las columnas {', '.join(faltantes)} en el archivo.")
+        for numero, valores in enumerate(filas, start=2):
+            fila = {
+                columna: str(valor).strip() if valor is not None else ''
+                for columna, valor in zip(encabezado, valores) if columna in COLUMNAS_IMPORTACION
+            }
+            if any(fila.values()):
+                yield numero, fila
+
+    def _abrir_archivo(self):
+        """
+        Abre el archivo subido desde su adjunto, sin cargarlo en memoria: desde
+        el filestore o, si el adjunto esta en la base de datos, desde sus datos.
+        """
+        adjunto = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_id', '=', self.id),
+            ('res_field', '=', 'archivo'),
+        ], limit=1)
+        if not adjunto:
+            raise UserError("Debe seleccionar un archivo.")
+        if adjunto.store_fname:
+            return open(adjunto._full_path(adjunto.store_fname), 'rb')
+        return io.BytesIO(adjunto.raw)
@@ -0,0 +1,146 @@
+import logging
+
+from odoo import models, fields, api
+from odoo.tools import sql
+
+_logger = logging.getLogger(__name__)
+
+# Indices compuestos que necesitan las rutinas de copia: (nombre, modelo, columnas, condicion).
+INDICES_COPIA = [
+    ('copia_rec_dev_ps_mstr_par_ref_idx', 'ps.mstr', ['ps_domain', 'ps_par', 'ps_ref'], ''),
+    ('copia_rec_dev_pt_mstr_part_group_idx', 'pt.mstr', ['pt_domain', 'pt_part', 'pt_group'], ''),
+    ('copia_rec_dev_pt_mstr_materia_idx', 'pt.mstr', ['pt_domain', 'pt_group', 'pt_part'],
+     "pt_group IN ('115', '020', '109')"),
+    ('copia_rec_dev_bom_mstr_parent_idx', 'bom.mstr', ['bom_domain', 'bom_parent'], ''),
+]
+
+
+class CopiaFichaIndice(models.TransientModel):
+    _name = 'copia.ficha.indice'
+    _description = 'Reporte de Indices de Copia de Ficha Tecnica'
+    _order = 'tabla, indice'
+
+    tabla = fields.Char(string="Tabla", readonly=True)
+    indice = fields.Char(string="Indice", readonly=True)
+    del_modulo = fields.Boolean(string="Indice del Modulo", readonly=True)
+    escaneos = fields.Integer(string="Escaneos del Indice", readonly=True)
+    escaneos_secuenciales = fields.Integer(string="Escaneos Secuenciales de la Tabla", readonly=True)
+    tamano = fields.Char(string="Tamano", readonly=True)
+    tamano_bytes = fields.Float(string="Tamano (bytes)", readonly=True)
+    tuplas_muertas_pct = fields.Float(string="Tuplas Muertas (%)", readonly=True,
+                                      help="Porcentaje de tuplas muertas de la tabla, estimacion de la hinchazon.")
+
+    def init(self):
+        """
+        Programa la creacion de los indices compuestos de las tablas de
+        estructura (ps_mstr, pt_mstr, bom_mstr) que no existan, salvo que ya
+        exista un indice equivalente. Los indices se crean con CREATE INDEX
+        CONCURRENTLY despues de confirmar la actualizacion del modulo, en una
+        conexion propia, por lo que no bloquean las escrituras sobre las tablas.
+        """
+        pendientes = []
+        for nombre, modelo, columnas, condicion in INDICES_COPIA:
+            if modelo not in self.env:
+                continue
+            tabla = self.env[modelo]._table
+            if sql.index_exists(self.env.cr, nombre) and self._indice_valido(self.env.cr, nombre):
+                continue
+            if not condicion:
+                equivalente = self._indice_equivalente(tabla, columnas)
+                if equivalente:
+                    _logger.info("Indice %s no creado: %s ya cubre %s(%s)", nombre, equivalente, tabla, ', '.join(columnas))
+                    continue
+            pendientes.append((nombre, tabla, columnas, condicion))
+        if pendientes:
+            registro = self.env.registry
+            self.env.cr.postcommit.add(lambda: self._crear_indices_concurrentes(registro, pendientes))
+
+    @api.model
+    def _crear_indices_concurrentes(self, registro, pendientes):
+        """
+        Crea los indices pendientes con CREATE INDEX CONCURRENTLY en una conexion
+        en modo autocommit. Un indice invalido que dejo una creacion interrumpida
+        se elimina antes de volver a crearlo. Un error en un indice se registra en
+        el log y no impide crear los demas.
+        """
+        with registro.cursor() as cr:
+            cr._cnx.autocommit = True
+            for nombre, tabla, columnas, condicion in pendientes:
+                try:
+                    if sql.index_exists(cr, nombre) and not self._indice_valido(cr, nombre):
+                        cr.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{nombre}"')
+                    columnas_sql = ', '.join(f'"{columna}"' for columna in columnas)
+                    condicion_sql = f' WHERE {condicion}' if condicion else ''
+                    cr.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{nombre}" ON "{tabla}" ({columnas_sql}){condicion_sql}')
+                    _logger.info("Indice %s creado en %s", nombre, tabla)
+                except Exception:
+                    _logger.exception("No se pudo crear el indice %s en %s", nombre, tabla)
+
+    def _indice_valido(self, cr, nombre):
+        """
+        Indica si el indice esta marcado como valido (una creacion concurrente
+        interrumpida deja el indice invalido).
+        """
+        cr.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)", [nombre])
+        fila = cr.fetchone()
+        return bool(fila and fila[0])
+
+    def _indice_equivalente(self, tabla, columnas):
+        """
+        Devuelve el nombre de un indice existente (no parcial) cuyas primeras
+        columnas son las indicadas, o None si no existe.
+        """
+        self.env.cr.execute("""
+            SELECT i.relname
+              FROM pg_index x
+              JOIN pg_class t ON t.oid = x.indrelid
+              JOIN pg_class i ON i.oid = x.indexrelid
+             WHERE t.relname = %s
+               AND x.indpred IS NULL
+               AND (SELECT array_agg(a.attname::text ORDER BY k.n)
+                      FROM unnest(x.indkey::int2[]) WITH ORDINALITY AS k(attnum, n)
+                      JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+                   )[1:%s] = %s::text[]
+             LIMIT 1
+        """, (tabla, len(columnas), columnas))
+        fila = self.env.cr.fetchone()
+        return fila[0] if fila else None
+
+    @api.model
+    def action_reporte_indices(self):
+        """
+        Reporta el uso (escaneos) y tamano de los indices de las tablas de
+        estructura, junto con los escaneos secuenciales y las tuplas muertas
+        de cada tabla.
+        """
+        tablas = list({self.env[modelo]._table for _, modelo, _, _ in INDICES_COPIA if modelo in self.env})
+        nombres_modulo = {nombre for nombre, _, _, _ in INDICES_COPIA}
+        self.env.cr.execute("""
+            SELECT s.relname, s.indexrelname, s.idx_scan,
+                   pg_relation_size(s.indexrelid), pg_size_pretty(pg_relation_size(s.indexrelid)),
+                   t.seq_scan,
+                   CASE WHEN t.n_live_tup + t.n_dead_tup > 0
+                        THEN 100.0 * t.n_dead_tup / (t.n_live_tup + t.n_dead_tup) ELSE 0 END
+              FROM pg_stat_user_indexes s
+              JOIN pg_stat_user_tables t ON t.relid = s.relid
+             WHERE s.relname IN %s
+        """, (tuple(tablas) or ('',),))
+        self.search([('create_uid', '=', self.env.uid)]).unlink()
+        self.create([{
+            'tabla': tabla,
+            'indice': indice,
+            'del_modulo': indice in nombres_modulo,
+            'escaneos': escaneos,
+            'tamano_bytes': tamano_bytes,
+            'tamano': tamano,
+            'escaneos_secuenciales': escaneos_secuenciales,
+            'tuplas_muertas_pct': tuplas_muertas_pct,
+        } for tabla, indice, escaneos, tamano_bytes, tamano, escaneos_secuenciales, tuplas_muertas_pct
+            in self.env.cr.fetchall()])
+        return {
+            'type': 'ir.actions.act_window',
+            'name': "Indices de Copia de Ficha Tecnica",
+            'res_model': 'copia.ficha.indice',
+            'view_mode': 'tree',
+            'target': 'current',
+        }
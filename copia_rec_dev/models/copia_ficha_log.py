@@ -0,0 +1,36 @@
+from odoo import models, fields
+
+
+class CopiaFichaLog(models.Model):
+    _name = 'copia.ficha.log'
+    _description = 'Registro de Ejecucion de Copia de Ficha Tecnica'
+    _order = 'id desc'
+
+    ficha_id = fields.Many2one('copia.ficha', string="Copia", ondelete='cascade', index=True)
+    modo = fields.Selection([
+        ('copia', 'Copia'),
+        ('lote', 'Copia en Lote'),
+        ('plan', 'Planificacion'),
+        ('aplicar', 'Aplicacion de Plan'),
+    ], string="Modo", required=True)
+    temporada = fields.Char(string="Temporada", index=True)
+    part_o = fields.Char(string="Articulo Origen", index=True)
+    part_d = fields.Char(string="Articulo Destino")
+    fase = fields.Char(string="Fase", required=True)
+    resultado = fields.Selection([
+        ('ok', 'Correcto'),
+        ('error', 'Error'),
+    ], string="Resultado")
+    duracion = fields.Float(string="Duracion (s)")
+    consultas = fields.Integer(string="Consultas SQL")
+    filas_leidas = fields.Integer(string="Filas Leidas")
+    filas_creadas = fields.Integer(string="Filas Creadas")
+    filas_escritas = fields.Integer(string="Filas Escritas")
+    filas_eliminadas = fields.Integer(string="Filas Eliminadas")
+    cache_aciertos = fields.Integer(string="Aciertos Cache Componentes")
+    cache_fallos = fields.Integer(string="Fallos Cache Componentes")
+    memoria_maxima = fields.Integer(string="Memoria Maxima (KB)", group_operator='max',
+                                    help="Memoria residente (RSS) que gano el proceso durante la fase. Solo se mide con "
+                                         "el parametro copia_rec_dev.medir_memoria; con trabajadores en "
+                                         "paralelo incluye la de los demas hilos.")
+    perfil = fields.Text(string="Perfil (cProfile)", prefetch=False)
@@ -0,0 +1,158 @@
+import base64
+import csv
+import io
+import logging
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+# Cantidad de trabajadores (conexiones a la base de datos) por defecto.
+TRABAJADORES_DEFECTO = 4
+
+# Tiempo maximo en segundos que una ejecucion del cron procesa la cola.
+LIMITE_TIEMPO_COLA_DEFECTO = 240
+
+
+class CopiaFichaLote(models.Model):
+    _name = 'copia.ficha.lote'
+    _description = 'Lote de Copias de Ficha Tecnica'
+    _order = 'id desc'
+
+    def _default_temporadas_id(self):
+        return self.env['receta']._temporada_actual()
+
+    name = fields.Char(string="Descripcion", required=True, default="Nuevo lote")
+    temporadas_id = fields.Many2one('receta', string='Temporada', readonly=True, default=_default_temporadas_id)
+    linea_ids = fields.One2many('copia.ficha', 'lote_id', string="Copias")
+    estado = fields.Selection([
+        ('borrador', 'Borrador'),
+        ('en_cola', 'En Cola'),
+        ('terminado', 'Terminado'),
+    ], string="Estado", default='borrador', required=True, readonly=True)
+    archivo_resultado = fields.Binary(string="Resultado de la Importacion", attachment=True, readonly=True)
+    nombre_resultado = fields.Char(string="Nombre del Resultado")
+    total_lineas = fields.Integer(string="Total", compute='_compute_totales')
+    total_hechas = fields.Integer(string="Hechas", compute='_compute_totales')
+    total_errores = fields.Integer(string="Con Error", compute='_compute_totales')
+
+    @api.depends('linea_ids.estado')
+    def _compute_totales(self):
+        for lote in self:
+            lote.total_lineas = len(lote.linea_ids)
+            lote.total_hechas = len(lote.linea_ids.filtered(lambda linea: linea.estado == 'hecho'))
+            lote.total_errores = len(lote.linea_ids.filtered(lambda linea: linea.estado == 'error'))
+
+    def action_encolar(self):
+        """
+        Prevalida y deja en cola las copias pendientes o con error del lote y despierta al cron.
+        """
+        lineas = self.linea_ids.filtered(lambda linea: linea.estado in ('borrador', 'error'))
+        if not lineas:
+            raise UserError("El lote no tiene copias pendientes.")
+# Prevalidar todo el lote con las mismas consultas; las copias invalidas no se encolan.
+        errores = lineas._validar_lote()
+        for linea in lineas.filtered(lambda linea: linea.id in errores):
+            linea.write({'estado': 'error', 'mensaje': f"Error de validación: {errores[linea.id]}", 'duracion': 0.0})
+        lineas.filtered(lambda linea: linea.id not in errores).write(
+            {'estado': 'en_cola', 'mensaje': "En cola.", 'duracion': 0.0})
+        self.write({'estado': 'en_cola'})
+        self.env.ref('copia_rec_dev.ir_cron_copia_ficha_cola')._trigger()
+
+    def _obtener_parametro_entero(self, clave, defecto):
+        valor = self.env['ir.config_parameter'].sudo().get_param(clave)
+        try:
+            return max(int(valor), 1)
+        except (TypeError, ValueError):
+            return defecto
+
+    @api.model
+    def _cron_procesar_cola(self):
+        """
+        Procesa las copias en cola con un conjunto de trabajadores locales.
+        Cada trabajador usa su propia conexion y toma las copias con
+        FOR UPDATE SKIP LOCKED, por lo que varios trabajadores (o varias
+        ejecuciones del cron) pueden avanzar en paralelo sin pisarse.
+        """
+        trabajadores = self._obtener_parametro_entero('copia_rec_dev.trabajadores', TRABAJADORES_DEFECTO)
+        limite_tiempo = time.monotonic() + self._obtener_parametro_entero(
+            'copia_rec_dev.limite_tiempo_cola', LIMITE_TIEMPO_COLA_DEFECTO)
+
+        with ThreadPoolExecutor(max_workers=trabajadores) as ejecutor:
+            futuros = [
+                ejecutor.submit(self._trabajador_cola, self.env.cr.dbname, self.env.uid, dict(self.env.context), limite_tiempo)
+                for _ in range(trabajadores)
+            ]
+            procesadas = sum(futuro.result() for futuro in futuros)
+        _logger.info("Cola de copias de ficha tecnica: %s copias procesadas", procesadas)
+
+# Los trabajadores confirmaron en otras transacciones: cerrar con un cursor nuevo.
+        with self.env.registry.cursor() as cr:
+            self.with_env(self.env(cr=cr))._cerrar_lotes_terminados()
+
+    def _trabajador_cola(self, dbname, uid, context, limite_tiempo):
+        """
+        Toma y procesa copias en cola, una por transaccion, hasta vaciar la cola
+        o agotar el tiempo disponible. Devuelve la cantidad de copias procesadas.
+        """
+        threading.current_thread().dbname = dbname
+        threading.current_thread().uid = uid
+        procesadas = 0
+        while time.monotonic() < limite_tiempo:
+            with self.env.registry.cursor() as cr:
+                env = api.Environment(cr, uid, context)
+                cr.execute("""
+                    SELECT id FROM copia_ficha
+                    WHERE estado = 'en_cola'
+                    ORDER BY lote_id, sequence, id
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                """)
+                fila = cr.fetchone()
+                if not fila:
+                    break
+                env['copia.ficha'].browse(fila[0])._procesar_en_cola()
+            procesadas += 1
+        return procesadas
+
+    def _cerrar_lotes_terminados(self):
+        """
+        Marca como terminados los lotes que ya no tienen copias en cola y
+        actualiza el resultado de los que vienen de una importacion.
+        """
+        lotes = self.search([('estado', '=', 'en_cola')])
+        terminados = lotes.filtered(
+            lambda lote: not any(linea.estado == 'en_cola' for linea in lote.linea_ids)
+        )
+        terminados.write({'estado': 'terminado'})
+        terminados._actualizar_resultado()
+
+    def _actualizar_resultado(self):
+        """
+        Reescribe el CSV de resultado de la importacion con el estado, la
+        duracion y el mensaje final de cada copia del lote, buscada por su
+        numero de fila (sequence). Las filas sin copia (articulos no
+        encontrados) conservan el resultado de la importacion.
+        """
+        for lote in self.filtered('archivo_resultado'):
+            copias = {
+                fila['sequence']: fila
+                for fila in self.env['copia.ficha'].search_read(
+                    [('lote_id', '=', lote.id)], ['sequence', 'estado', 'duracion', 'mensaje'])
+            }
+            with tempfile.TemporaryFile(mode='w+', newline='', encoding='utf-8') as resultado:
+                lector = csv.reader(io.StringIO(base64.b64decode(lote.archivo_resultado).decode('utf-8'), newline=''))
+                escritor = csv.writer(resultado)
+                escritor.writerow(next(lector))
+                for valores in lector:
+                    copia = copias.get(int(valores[0]))
+                    if copia:
+                        valores[3:] = [copia['estado'], f"{copia['duracion']:.2f}", copia['mensaje'] or '']
+                    escritor.writerow(valores)
+                resultado.seek(0)
+                lote.archivo_resultado = base64.b64encode(resultado.read().encode('utf-8'))
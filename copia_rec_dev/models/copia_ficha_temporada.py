@@ -0,0 +1,321 @@
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+
+from .copia_ficha_lote import LIMITE_TIEMPO_COLA_DEFECTO, TRABAJADORES_DEFECTO
+from .copiaficha import CopiaConcurrente
+from .motor_sql import MotorCopiaSql
+
+_logger = logging.getLogger(__name__)
+
+
+# Filas de formula maximas por particion de los articulos sin modelo (componentes).
+FILAS_PARTICION_SIN_MODELO = 50000
+
+
+class CopiaFichaTemporada(models.Model):
+    _name = 'copia.ficha.temporada'
+    _description = 'Traspaso de Fichas Tecnicas entre Temporadas'
+    _order = 'id desc'
+
+    def _default_temporada_origen(self):
+        return self.env['receta']._temporada_actual().code_value
+
+    name = fields.Char(string="Descripcion", required=True, default="Nuevo traspaso")
+    temporada_origen = fields.Char(string="Temporada Origen", required=True, default=_default_temporada_origen)
+    temporada_destino = fields.Char(string="Temporada Destino", required=True)
+    estado = fields.Selection([
+        ('borrador', 'Borrador'),
+        ('en_curso', 'En Curso'),
+        ('terminado', 'Terminado'),
+        ('error', 'Con Errores'),
+    ], string="Estado", default='borrador', required=True, readonly=True)
+    particion_ids = fields.One2many('copia.ficha.temporada.particion', 'traspaso_id', string="Particiones")
+    total_particiones = fields.Integer(string="Particiones", compute='_compute_totales')
+    total_hechas = fields.Integer(string="Hechas", compute='_compute_totales')
+    total_errores = fields.Integer(string="Con Error", compute='_compute_totales')
+    filas_origen = fields.Integer(string="Filas Origen", compute='_compute_totales')
+    filas_copiadas = fields.Integer(string="Filas Copiadas", compute='_compute_totales')
+
+    @api.depends('particion_ids.estado', 'particion_ids.filas_copiadas')
+    def _compute_totales(self):
+        for traspaso in self:
+            particiones = traspaso.particion_ids
+            traspaso.total_particiones = len(particiones)
+            traspaso.total_hechas = len(particiones.filtered(lambda particion: particion.estado == 'hecho'))
+            traspaso.total_errores = len(particiones.filtered(lambda particion: particion.estado == 'error'))
+            traspaso.filas_origen = sum(particiones.mapped('filas_origen'))
+            traspaso.filas_copiadas = sum(particiones.mapped('filas_copiadas'))
+
+    def action_iniciar(self):
+        """
+        Valida las temporadas, divide las formulas de la temporada origen en una
+        particion por modelo de articulo y despierta al cron.
+        """
+        for traspaso in self:
+            traspaso._validar_traspaso()
+            if not traspaso.particion_ids:
+                traspaso._crear_particiones()
+        self.write({'estado': 'en_curso'})
+        self.env.ref('copia_rec_dev.ir_cron_copia_ficha_temporada')._trigger()
+
+    def action_reanudar(self):
+        """
+        Vuelve a dejar pendientes las particiones con error y continua el traspaso;
+        las particiones hechas no se repiten.
+        """
+        self.particion_ids.filtered(lambda particion: particion.estado == 'error').write(
+            {'estado': 'pendiente', 'mensaje': False})
+        self.write({'estado': 'en_curso'})
+        self.env.ref('copia_rec_dev.ir_cron_copia_ficha_temporada')._trigger()
+
+    def _validar_traspaso(self):
+        self.ensure_one()
+        if self.temporada_origen == self.temporada_destino:
+            raise UserError("La temporada origen y destino deben ser diferentes.")
+        temporadas = {fila['code_value'] for fila in self.env['code.mstr'].search_read([
+            ('code_domain', '=', 'global_domain'),
+            ('code_fldname', '=', 'TEMPORADA'),
+            ('code_value', 'in', [self.temporada_origen, self.temporada_destino])
+        ], ['code_value'])}
+        for temporada in (self.temporada_origen, self.temporada_destino):
+            if temporada not in temporadas:
+                raise UserError(f"La temporada {temporada} no existe.")
+
+    def _crear_particiones(self):
+        """
+        Crea una particion por modelo de articulo (segun el indice de
+        combinaciones) con sus articulos y la cantidad de filas de formula de la
+        temporada origen, con una sola lectura de la temporada. Los componentes
+        sin modelo se dividen en particiones de hasta FILAS_PARTICION_SIN_MODELO filas.
+        """
+        self.ensure_one()
+        combinacion = self.env['copia.ficha.combinacion']
+        combinacion._recalcular()
+        self.env['ps.mstr'].flush_model(['ps_domain', 'ps_par', 'ps_ref'])
+        self.env.cr.execute(f"""
+            SELECT c.pt_model, o.ps_par, count(*)
+              FROM {self.env['ps.mstr']._table} o
+              LEFT JOIN (
+                  SELECT DISTINCT ON (default_code) default_code, pt_model
+                    FROM {combinacion._table}
+                   ORDER BY default_code, id
+              ) c ON c.default_code = o.ps_par
+             WHERE o.ps_domain = 'global_domain' AND o.ps_ref = %s
+             GROUP BY c.pt_model, o.ps_par
+             ORDER BY c.pt_model, o.ps_par
+        """, [self.temporada_origen])
+        articulos_por_modelo = {}
+        for modelo, articulo, filas in self.env.cr.fetchall():
+            articulos_por_modelo.setdefault(modelo, []).append((articulo, filas))
+        if not articulos_por_modelo:
+            raise UserError(f"La temporada {self.temporada_origen} no tiene fichas tecnicas.")
+
+        vals_list = []
+        for modelo, articulos in articulos_por_modelo.items():
+            bloques = [articulos] if modelo else self._dividir_articulos(articulos, FILAS_PARTICION_SIN_MODELO)
+            vals_list += [{
+                'traspaso_id': self.id,
+                'pt_model': modelo or False,
+                'articulos': json.dumps([articulo for articulo, filas in bloque]),
+                'total_articulos': len(bloque),
+                'filas_origen': sum(filas for articulo, filas in bloque),
+            } for bloque in bloques]
+        self.env['copia.ficha.temporada.particion'].create(vals_list)
+
+    def _dividir_articulos(self, articulos, filas_maximas):
+        """
+        Divide una lista de (articulo, filas) en bloques de hasta 'filas_maximas'
+        filas; un articulo con mas filas queda solo en su bloque.
+        """
+        bloques, bloque, filas_bloque = [], [], 0
+        for articulo, filas in articulos:
+            if bloque and filas_bloque + filas > filas_maximas:
+                bloques.append(bloque)
+                bloque, filas_bloque = [], 0
+            bloque.append((articulo, filas))
+            filas_bloque += filas
+        if bloque:
+            bloques.append(bloque)
+        return bloques
+
+    @api.model
+    def _cron_procesar_traspasos(self):
+        """
+        Procesa las particiones pendientes de los traspasos en curso con un
+        conjunto de trabajadores locales. Cada particion se toma con FOR UPDATE
+        SKIP LOCKED y se copia y marca como hecha en la misma transaccion, por lo
+        que varias ejecuciones del cron pueden avanzar en paralelo y un traspaso
+        interrumpido continua desde las particiones pendientes.
+        """
+        lote = self.env['copia.ficha.lote']
+        trabajadores = lote._obtener_parametro_entero('copia_rec_dev.trabajadores', TRABAJADORES_DEFECTO)
+        limite_tiempo = time.monotonic() + lote._obtener_parametro_entero(
+            'copia_rec_dev.limite_tiempo_cola', LIMITE_TIEMPO_COLA_DEFECTO)
+
+        with ThreadPoolExecutor(max_workers=trabajadores) as ejecutor:
+            futuros = [
+                ejecutor.submit(self._trabajador_traspaso, self.env.cr.dbname, self.env.uid, dict(self.env.context), limite_tiempo)
+                for _ in range(trabajadores)
+            ]
+            procesadas = sum(futuro.result() for futuro in futuros)
+        _logger.info("Traspaso de temporadas: %s particiones procesadas", procesadas)
+
+# Los trabajadores confirmaron en otras transacciones: cerrar con un cursor nuevo.
+        with self.env.registry.cursor() as cr:
+            self.with_env(self.env(cr=cr))._cerrar_traspasos_terminados()
+
+    def _trabajador_traspaso(self, dbname, uid, context, limite_tiempo):
+        """
+        Toma y procesa particiones, una por transaccion, hasta terminarlas o
+        agotar el tiempo disponible. Devuelve la cantidad de particiones procesadas.
+        """
+        threading.current_thread().dbname = dbname
+        threading.current_thread().uid = uid
+        procesadas = 0
+        while time.monotonic() < limite_tiempo:
+            with self.env.registry.cursor() as cr:
+                env = api.Environment(cr, uid, context)
+                cr.execute("""
+                    SELECT p.id FROM copia_ficha_temporada_particion p
+                      JOIN copia_ficha_temporada t ON t.id = p.traspaso_id
+                    WHERE p.estado = 'pendiente' AND t.estado = 'en_curso'
+                    ORDER BY p.traspaso_id, p.filas_origen DESC, p.id
+                    LIMIT 1
+                    FOR UPDATE OF p SKIP LOCKED
+                """)
+                fila = cr.fetchone()
+                if not fila:
+                    break
+                env['copia.ficha.temporada.particion'].browse(fila[0])._procesar()
+            procesadas += 1
+        return procesadas
+
+    def _cerrar_traspasos_terminados(self):
+        """
+        Marca como terminados (o con errores) los traspasos sin particiones pendientes.
+        """
+        for traspaso in self.search([('estado', '=', 'en_curso')]):
+            estados = set(traspaso.particion_ids.mapped('estado'))
+            if 'pendiente' not in estados:
+                traspaso.estado = 'error' if 'error' in estados else 'terminado'
+
+
+class CopiaFichaTemporadaParticion(models.Model):
+    _name = 'copia.ficha.temporada.particion'
+    _description = 'Particion de Traspaso de Fichas Tecnicas'
+    _order = 'traspaso_id, pt_model, id'
+
+    traspaso_id = fields.Many2one('copia.ficha.temporada', string="Traspaso", required=True, ondelete='cascade', index=True)
+    pt_model = fields.Char(string="Modelo", help="Vacio para las formulas de articulos sin modelo (componentes).")
+    articulos = fields.Text(string="Lista de Articulos", readonly=True, prefetch=False,
+                            help="Lista JSON de los articulos (ps_par) de la particion.")
+    total_articulos = fields.Integer(string="Articulos", readonly=True)
+    estado = fields.Selection([
+        ('pendiente', 'Pendiente'),
+        ('hecho', 'Hecho'),
+        ('error', 'Error'),
+    ], string="Estado", default='pendiente', required=True, index=True, readonly=True)
+    filas_origen = fields.Integer(string="Filas Origen", readonly=True)
+    filas_copiadas = fields.Integer(string="Filas Copiadas", readonly=True)
+    duracion = fields.Float(string="Duracion (s)", readonly=True)
+    mensaje = fields.Char(string="Mensaje", readonly=True)
+
+    def _procesar(self):
+        """
+        Copia las formulas de los articulos de la particion a la temporada
+        destino reescribiendo ps_ref, con el motor de copia configurado: un solo
+        INSERT ... SELECT (motor SQL) o lectura, clonado y creacion multiple
+        (motor ORM). Antes se bloquean los articulos en la temporada destino.
+        Los articulos que ya tienen formulas en la temporada destino se omiten,
+        por lo que repetir una particion no duplica filas.
+        """
+        self.ensure_one()
+        traspaso = self.traspaso_id
+        ficha = self.env['copia.ficha']
+        articulos = json.loads(self.articulos or '[]')
+        inicio = time.perf_counter()
+        filas = 0
+        try:
+            with self.env.cr.savepoint():
+                ficha._bloquear_destinos(articulos, traspaso.temporada_destino)
+                if ficha._obtener_motor_copia() == 'sql':
+                    filas = self._copiar_sql(articulos)
+                else:
+                    filas = self._copiar_orm(articulos)
+            estado, mensaje = 'hecho', f"{filas} filas copiadas."
+        except CopiaConcurrente as e:
+# Dejarla pendiente: un trabajador la vuelve a tomar en una transaccion nueva.
+            filas = 0
+            estado, mensaje = 'pendiente', f"Reintentando: {str(e)}"
+        except UserError as e:
+            filas = 0
+            estado, mensaje = 'error', str(e)
+        except Exception as e:
+            _logger.exception("Error en el traspaso %s, modelo %s", traspaso.id, self.pt_model)
+            filas = 0
+            estado, mensaje = 'error', f"Error inesperado: {str(e)}"
+        self.write({
+            'estado': estado,
+            'filas_copiadas': filas,
+            'duracion': time.perf_counter() - inicio,
+            'mensaje': mensaje,
+        })
+
+    def _copiar_sql(self, articulos):
+        """
+        Copia las formulas de los articulos con un solo INSERT ... SELECT.
+        Devuelve la cantidad de filas creadas.
+        """
+        traspaso = self.traspaso_id
+        tabla = self.env['ps.mstr']._table
+        motor = MotorCopiaSql(self.env, 'ps.mstr', self.env['copia.ficha']._campos_copiables('ps.mstr'))
+        return motor.copiar(
+            "",
+            f"""o.ps_domain = 'global_domain' AND o.ps_ref = %(origen)s
+                AND o.ps_par = ANY(%(articulos)s)
+                AND NOT EXISTS (
+                    SELECT 1 FROM {tabla} x
+                     WHERE x.ps_domain = o.ps_domain AND x.ps_par = o.ps_par AND x.ps_ref = %(destino)s
+                )""",
+            {
+                'origen': traspaso.temporada_origen,
+                'destino': traspaso.temporada_destino,
+                'articulos': articulos,
+            },
+            expresiones={'ps_ref': '%(destino)s'},
+            orden='o.ps_par, o.id',
+        )
+
+    def _copiar_orm(self, articulos):
+        """
+        Copia las formulas de los articulos con el ORM: lee las filas origen de
+        los articulos sin formulas en la temporada destino, las clona con el
+        nuevo ps_ref y las crea con creaciones multiples.
+        Devuelve la cantidad de filas creadas.
+        """
+        traspaso = self.traspaso_id
+        ficha = self.env['copia.ficha']
+        con_formulas = {
+            grupo['ps_par'] for grupo in self.env['ps.mstr'].read_group([
+                ('ps_domain', '=', 'global_domain'),
+                ('ps_par', 'in', articulos),
+                ('ps_ref', '=', traspaso.temporada_destino),
+            ], ['ps_par'], ['ps_par'])
+        }
+        pendientes = [articulo for articulo in articulos if articulo not in con_formulas]
+        if not pendientes:
+            return 0
+        filas = ficha._leer_filas('ps.mstr', [
+            ('ps_domain', '=', 'global_domain'),
+            ('ps_par', 'in', pendientes),
+            ('ps_ref', '=', traspaso.temporada_origen),
+        ])
+        vals_list = ficha._clonar_filas(filas, {'ps_ref': traspaso.temporada_destino})
+        ficha._crear_en_lotes('ps.mstr', vals_list)
+        return len(vals_list)
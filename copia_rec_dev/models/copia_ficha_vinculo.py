@@ -0,0 +1,160 @@
+import logging
+from collections import defaultdict
+
+from odoo import models, fields, api
+from odoo.osv import expression
+
+_logger = logging.getLogger(__name__)
+
+
+class CopiaFichaVinculo(models.Model):
+    _name = 'copia.ficha.vinculo'
+    _description = 'Vinculo de Copia de Ficha Tecnica'
+    _order = 'temporada, part_o, part_d'
+
+    ficha_id = fields.Many2one('copia.ficha', string="Copia", required=True, ondelete='cascade', index=True)
+    modo = fields.Selection([
+        ('numero', 'Numeraciones'),
+        ('color', 'Color'),
+    ], string="Modo", required=True)
+    temporada = fields.Char(string="Temporada", required=True, index=True)
+    part_o = fields.Char(string="Articulo Origen", required=True, index=True)
+    part_d = fields.Char(string="Articulo Destino", required=True, index=True)
+    m_modelo_o = fields.Char(string="Modelo Origen")
+    m_modelo_d = fields.Char(string="Modelo Destino")
+    ult_mod_date = fields.Date(string="Ultima Modificacion Sincronizada", readonly=True)
+    ult_id = fields.Integer(string="Ultimo Id Sincronizado", readonly=True)
+    ult_write_date = fields.Datetime(string="Ultima Escritura Sincronizada", readonly=True)
+    num_lineas_origen = fields.Integer(string="Lineas Origen", readonly=True)
+    fecha_sincronizacion = fields.Datetime(string="Fecha de Sincronizacion", readonly=True)
+
+    _sql_constraints = [
+        ('vinculo_unico', 'unique(part_o, part_d, temporada)',
+         "Ya existe un vinculo para el articulo origen, destino y temporada."),
+    ]
+
+    @api.model
+    def _estado_origen(self, part_o, temporada):
+        """
+        Devuelve la marca de agua de la formula origen: ultima ps_mod_date,
+        ultimo id, ultima write_date (cambios hechos sin tocar ps_mod_date) y
+        cantidad de lineas.
+        """
+        self.env['ps.mstr'].flush_model()
+        self.env.cr.execute(f"""
+            SELECT max(ps_mod_date), max(id), max(write_date), count(*)
+              FROM {self.env['ps.mstr']._table}
+             WHERE ps_domain = 'global_domain' AND ps_par = %s AND ps_ref = %s
+        """, (part_o, temporada))
+        ult_mod_date, ult_id, ult_write_date, num_lineas = self.env.cr.fetchone()
+        return {
+            'ult_mod_date': ult_mod_date or False,
+            'ult_id': ult_id or 0,
+            'ult_write_date': ult_write_date or False,
+            'num_lineas_origen': num_lineas,
+        }
+
+    @api.model
+    def _registrar(self, ficha, destinos):
+        """
+        Registra (o actualiza) los vinculos origen/destino/temporada de una copia
+        terminada con la marca de agua actual de la formula origen.
+        """
+        part_o = ficha._codigo_articulo(ficha.part_o)
+        temporada = ficha.temporadas_id.code_value
+        valores = dict(
+            self._estado_origen(part_o, temporada),
+            ficha_id=ficha.id,
+            modo='numero' if ficha.m_numero_color else 'color',
+            m_modelo_o=ficha.m_modelo_o,
+            m_modelo_d=ficha.m_modelo_d,
+            fecha_sincronizacion=fields.Datetime.now(),
+        )
+        existentes = self.search([
+            ('part_o', '=', part_o),
+            ('temporada', '=', temporada),
+            ('part_d', 'in', list(destinos)),
+        ])
+        existentes.write(valores)
+        nuevos = set(destinos) - set(existentes.mapped('part_d'))
+        self.create([
+            dict(valores, part_o=part_o, part_d=part_d, temporada=temporada)
+            for part_d in sorted(nuevos)
+        ])
+
+    @api.model
+    def _cron_sincronizacion_incremental(self):
+        self.search([])._sincronizar_incremental(confirmar=True)
+
+    def action_sincronizar(self):
+        self._sincronizar_incremental()
+
+    def _sincronizar_incremental(self, confirmar=False):
+        """
+        Propaga a los destinos vinculados solo las lineas origen modificadas o
+        nuevas desde la ultima sincronizacion. Cada origen se procesa en su
+        propio savepoint y, desde el cron, se confirma al terminar.
+        """
+        grupos = defaultdict(lambda: self.browse())
+        for vinculo in self:
+            grupos[(vinculo.ficha_id, vinculo.part_o, vinculo.temporada)] |= vinculo
+
+        for (ficha, part_o, temporada), vinculos in grupos.items():
+            try:
+                with self.env.cr.savepoint():
+                    vinculos._sincronizar_grupo(ficha, part_o, temporada)
+            except Exception:
+                _logger.exception("Error al sincronizar la ficha tecnica %s (%s)", part_o, temporada)
+            if confirmar:
+                self.env.cr.commit()
+
+    def _sincronizar_grupo(self, ficha, part_o, temporada):
+        """
+        Sincroniza los vinculos de un mismo origen y temporada. Si el origen
+        tiene menos lineas o un ultimo id menor que en la sincronizacion anterior
+        (lineas eliminadas), si el vinculo no tiene ultima write_date, o si
+        despues de aplicar los cambios el destino no tendria la misma cantidad
+        de lineas que el origen (lineas con clave cambiada), se hace una
+        sincronizacion completa de ese destino.
+        """
+        estado = self._estado_origen(part_o, temporada)
+        marca = ('ult_id', 'ult_mod_date', 'ult_write_date', 'num_lineas_origen')
+        pendientes = self.filtered(
+            lambda vinculo: tuple(vinculo[campo] for campo in marca) != tuple(estado[campo] for campo in marca))
+        if not pendientes:
+            return
+
+        dominio_origen = [
+            ('ps_domain', '=', 'global_domain'),
+            ('ps_par', '=', part_o),
+            ('ps_ref', '=', temporada),
+        ]
+        condiciones = [[('id', '>', min(pendientes.mapped('ult_id')))]]
+        fechas = [fecha for fecha in pendientes.mapped('ult_mod_date') if fecha]
+        if fechas and len(fechas) == len(pendientes):
+            condiciones.append([('ps_mod_date', '>=', min(fechas))])
+        escrituras = [fecha for fecha in pendientes.mapped('ult_write_date') if fecha]
+        if escrituras and len(escrituras) == len(pendientes):
+            condiciones.append([('write_date', '>', min(escrituras))])
+        cambios = expression.OR(condiciones)
+        ficha = ficha.with_context(generaciones_cache_componentes=self.env['pt.mstr']._generaciones_cache_componentes())
+        filas_cambiadas = ficha._leer_filas('ps.mstr', dominio_origen + cambios)
+
+        ficha._bloquear_destinos(pendientes.mapped('part_d'), temporada)
+        filas_origen = None
+        for vinculo in pendientes:
+            completa = (
+                estado['num_lineas_origen'] < vinculo.num_lineas_origen
+                or estado['ult_id'] < vinculo.ult_id
+                or not vinculo.ult_write_date
+            )
+            if not completa:
+                plan, lineas_destino = ficha._planificar_sincronizacion(vinculo, filas_cambiadas)
+                completa = lineas_destino != estado['num_lineas_origen']
+            if completa:
+                if filas_origen is None:
+                    filas_origen = ficha._leer_filas('ps.mstr', dominio_origen)
+                plan, lineas_destino = ficha._planificar_sincronizacion(vinculo, filas_origen, eliminar_sobrantes=True)
+            ficha._aplicar_plan(plan)
+
+        pendientes.write(dict(estado, fecha_sincronizacion=fields.Datetime.now()))
@@ -1,5 +1,65 @@
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from psycopg2 import errors
+
 from odoo import models, fields, api
-from odoo.exceptions import ValidationError
+from odoo.exceptions import UserError, ValidationError
+
+from .componente_cache import cache_componentes
+from .medidor_copia import MedidorCopia, memoria_actual
+from .motor_sql import EXPRESION_RENUMERAR, MotorCopiaSql
+from .plan_copia import PlanCopia
+
+_logger = logging.getLogger(__name__)
+
+# Tamano de lote por defecto para las creaciones multiples de formulas.
+TAMANO_LOTE_DEFECTO = 500
+
+# Segundos por defecto que una copia espera los bloqueos de sus articulos destino.
+ESPERA_BLOQUEO_DEFECTO = 10
+
+# Clave estable de una linea de formula para la sincronizacion por diferencias.
+CLAVE_SINCRONIZACION = ('ps_par', 'ps_ref', 'ps_comp', 'ps_op', 'ps_item_no')
+
+# Campos que nunca se copian al clonar filas de ps.mstr/bom.mstr.
+CAMPOS_NO_COPIABLES = {'id', 'create_uid', 'create_date', 'write_uid', 'write_date'}
+
+# Mapeo predefinido de componentes antiguos a componentes nuevos.
+MAPEO_COMPONENTES = {
+    'COMPONENTE_ANTIGUO_1': 'COMPONENTE_NUEVO_1',
+    'COMPONENTE_ANTIGUO_2': 'COMPONENTE_NUEVO_2',
+}
+
+# Grupos de materias primas que se cambian (Tacos, Contrafuerte, Puntaduras).
+GRUPOS_MATERIA = ('115', '020', '109')
+
+# Campo de cl.product.articulo con el codigo del articulo (ps_par, default_code).
+CAMPO_CODIGO_ARTICULO = 'default_code'
+
+# Campos de la formula origen que se escriben en la linea destino al sustituir
+# un componente (ademas del nuevo ps_comp).
+CAMPOS_CAMBIO_COMPONENTE = (
+    'ps_qty_per', 'ps_scrp_pct', 'ps_ps_code', 'ps_lt_off', 'ps_start', 'ps_end',
+    'ps_rmks', 'ps_op', 'ps_item_no', 'ps_mandatory', 'ps_exclusive', 'ps_process',
+    'ps_qty_type', 'ps_user1', 'ps_user2', 'ps_fcst_pct', 'ps_default',
+)
+
+# Descripcion de las huellas de un plan de copia para el mensaje cuando cambiaron.
+HUELLAS_PLAN = {
+    'origen': "la formula del articulo origen",
+    'destinos': "las formulas de los articulos destino",
+}
+
+
+class CopiaConcurrente(UserError):
+    """
+    Otra copia escribio en los articulos destino despues de que la transaccion
+    tomo su instantanea; la copia debe repetirse en una transaccion nueva.
+    """
+
 
 class CopiaFicha(models.Model):
     _name = 'copia.ficha'
@@ -9,8 +69,11 @@ class CopiaFicha(models.Model):
 
     sequence = fields.Integer(string="Secuencia", default=10)
     part_o = fields.Many2one('cl.product.articulo', string='Articulo Origen', required=True)
-    part_d = fields.Many2one('cl.product.articulo', string='Articulo Destino', required=True)
+    part_d = fields.Many2one('cl.product.articulo', string='Articulo Destino')
     m_numero_color = fields.Boolean(string="Copiar Numeraciones/Ficha Tecnica", default=True)
+    m_sincronizar = fields.Boolean(string="Sincronizar sin Recrear",
+                                   help="Actualiza la ficha tecnica existente del articulo destino: "
+                                        "solo inserta las lineas nuevas, actualiza las que cambian y elimina las sobrantes.")
     copia = fields.Boolean(string="Copia")
     m_modelo_o = fields.Char(string="Modelo Origen")
     m_modelo_d = fields.Char(string="Modelo Destino")
@@ -25,17 +88,29 @@ class CopiaFicha(models.Model):
 
     temporada = fields.Char(string="Temporada", required=False)
 
+    lote_id = fields.Many2one('copia.ficha.lote', string="Lote", ondelete='cascade', index=True)
+    estado = fields.Selection([
+        ('borrador', 'Borrador'),
+        ('en_cola', 'En Cola'),
+        ('hecho', 'Hecho'),
+        ('error', 'Error'),
+    ], string="Estado", default='borrador', required=True, index=True, readonly=True)
+    duracion = fields.Float(string="Duracion (s)", readonly=True)
+    plan_copia = fields.Text(string="Plan de Copia", readonly=True, prefetch=False)
+
     @api.depends('create_date')
     def _compute_temporadas_id(self):
+        latest_receta = self.env['receta']._temporada_actual()
         for record in self:
-            latest_receta = self.env['receta'].search([], order='id desc', limit=1)
             record.temporadas_id = latest_receta.id if latest_receta else False
 
-    @api.model
-    def create(self, vals):
-        latest_receta = self.env['receta'].search([], order='id desc', limit=1)
-        vals['temporadas_id'] = latest_receta.id if latest_receta else False
-        return super(CopiaFicha, self).create(vals)
+    @api.model_create_multi
+    def create(self, vals_list):
+# La temporada vigente se resuelve una sola vez para todo el lote de registros.
+        latest_receta = self.env['receta']._temporada_actual()
+        for vals in vals_list:
+            vals['temporadas_id'] = latest_receta.id if latest_receta else False
+        return super(CopiaFicha, self).create(vals_list)
 
 # Validacion de Campos, se validan antes de cualquier operacion.
     @api.constrains('temporadas_id', 'part_o', 'part_d', 'm_numero_color')
@@ -54,84 +129,562 @@ class CopiaFicha(models.Model):
         Funcion principal que realiza las validaciones y copia de recetas.
         """
         self.ensure_one()
+        ficha, medidor = self._iniciar_medicion()
+        resultado = 'error'
         try:
-# Validar que la temporada exista en la base de datos.
-            temporada_existente = self.env['code.mstr'].search([
+            with self.env.cr.savepoint():
+                ficha._bloquear_destinos(ficha._destinos_copia())
+                with ficha._fase('validacion'):
+                    ficha._validar_copia()
+                resumen = ficha._ejecutar_copia()
+
+            self.mensaje = "Proceso de copia completado correctamente."
+            if self.m_sincronizar and not self.m_numero_color:
+                self.mensaje = (
+                    f"Sincronizacion completada: {resumen['crear']} lineas insertadas, "
+                    f"{resumen['actualizar']} actualizadas y {resumen['eliminar']} eliminadas."
+                )
+            resultado = 'ok'
+            _logger.debug("Cache de componentes: %s", cache_componentes.estadisticas())
+        except ValidationError as e:
+            self.mensaje = f"Error de validación: {str(e)}"
+            return 
+        except UserError as e:
+            self.mensaje = str(e)
+            return 
+        except Exception as e:
+            self.mensaje = f"Error inesperado: {str(e)}"
+            return 
+        finally:
+            self._guardar_medicion(medidor, 'copia', resultado)
+
+    def _procesar_en_cola(self):
+        """
+        Ejecuta la copia de un registro en cola dentro de un savepoint y deja
+        el estado, la duracion y el resultado en el propio registro.
+        """
+        self.ensure_one()
+        ficha, medidor = self._iniciar_medicion()
+        inicio = time.perf_counter()
+        try:
+            with self.env.cr.savepoint():
+                ficha._bloquear_destinos(ficha._destinos_copia())
+                with ficha._fase('validacion'):
+                    ficha._validar_copia()
+                ficha._ejecutar_copia()
+            estado, mensaje = 'hecho', "Proceso de copia completado correctamente."
+        except ValidationError as e:
+            estado, mensaje = 'error', f"Error de validación: {str(e)}"
+        except CopiaConcurrente as e:
+# Dejarla en cola: el trabajador la vuelve a tomar en una transaccion nueva.
+            estado, mensaje = 'en_cola', f"Reintentando: {str(e)}"
+        except UserError as e:
+            estado, mensaje = 'error', str(e)
+        except Exception as e:
+            _logger.exception("Error inesperado al copiar la ficha %s", self.id)
+            estado, mensaje = 'error', f"Error inesperado: {str(e)}"
+        duracion = time.perf_counter() - inicio
+        self.write({
+            'estado': estado,
+            'duracion': duracion,
+            'mensaje': f"{mensaje} ({duracion:.2f} s)",
+        })
+        self._guardar_medicion(medidor, 'lote', 'ok' if estado == 'hecho' else 'error')
+
+    def _iniciar_medicion(self):
+        """
+        Devuelve el registro con un medidor de fases y las generaciones de la
+        cache de componentes en el contexto, y el medidor. El perfil cProfile y la
+        medicion de memoria se activan con los parametros del sistema
+        'copia_rec_dev.perfilar' y 'copia_rec_dev.medir_memoria'.
+        """
+        parametros = self.env['ir.config_parameter'].sudo()
+        medidor = MedidorCopia(
+            self.env.cr,
+            perfilar=parametros.get_param('copia_rec_dev.perfilar') in ('1', 'True', 'true'),
+            medir_memoria=parametros.get_param('copia_rec_dev.medir_memoria') in ('1', 'True', 'true'),
+        )
+        ficha = self.with_context(
+            medidor_copia=medidor,
+            generaciones_cache_componentes=self.env['pt.mstr']._generaciones_cache_componentes(),
+        )
+        return ficha, medidor
+
+    @contextmanager
+    def _fase(self, nombre):
+        """
+        Mide una fase de la copia si hay un medidor en el contexto.
+        """
+        medidor = self.env.context.get('medidor_copia')
+        if not medidor:
+            yield
+            return
+        with medidor.fase(nombre):
+            yield
+            self.env.flush_all()
+
+    def _contar_filas(self, contador, cantidad):
+        """
+        Suma filas leidas/creadas/escritas/eliminadas, o aciertos/fallos de la
+        cache de componentes, a la fase en curso.
+        """
+        medidor = self.env.context.get('medidor_copia')
+        if medidor:
+            medidor.contar(contador, cantidad)
+
+    def _guardar_medicion(self, medidor, modo, resultado):
+        """
+        Guarda en copia.ficha.log una linea por fase medida y una linea con el total.
+        """
+        if not medidor.fases:
+            return
+        comunes = {
+            'ficha_id': self.id,
+            'modo': modo,
+            'resultado': resultado,
+            'temporada': self.temporadas_id.code_value,
+            'part_o': self._codigo_articulo(self.part_o),
+            'part_d': self._codigo_articulo(self.part_d),
+        }
+        campos_suma = (
+            'duracion', 'consultas', 'filas_leidas', 'filas_creadas', 'filas_escritas', 'filas_eliminadas',
+            'cache_aciertos', 'cache_fallos',
+        )
+        total = dict(comunes, fase='total', **{campo: sum(fase[campo] for fase in medidor.fases) for campo in campos_suma})
+        total['memoria_maxima'] = max(fase['memoria_maxima'] for fase in medidor.fases)
+        self.env['copia.ficha.log'].sudo().create([dict(comunes, **fase) for fase in medidor.fases] + [total])
+
+    @api.model
+    def _campo_codigo_articulo(self):
+        """
+        Devuelve el campo con el codigo de cl.product.articulo: 'default_code'
+        si existe y si no el campo de su _rec_name, nunca el display_name.
+        """
+        articulo = self.env['cl.product.articulo']
+        if CAMPO_CODIGO_ARTICULO in articulo._fields:
+            return CAMPO_CODIGO_ARTICULO
+        return articulo._rec_name
+
+    def _codigo_articulo(self, articulo):
+        """
+        Devuelve el codigo de un articulo, ya sea un registro de cl.product.articulo o un codigo.
+        """
+        if isinstance(articulo, models.BaseModel):
+            return articulo[self._campo_codigo_articulo()] if articulo else False
+        return articulo
+
+    def _datos_validacion(self):
+        """
+        Carga con cuatro consultas los datos que necesitan las validaciones de todos
+        los registros: temporadas existentes, atributos de los articulos origen y
+        destino, numero de combinaciones indexado de cada articulo y cantidad de
+        formulas por articulo y temporada.
+        """
+        temporadas = list({valor for valor in self.mapped('temporadas_id.code_value') if valor})
+        codigos = list({
+            self._codigo_articulo(articulo)
+            for record in self for articulo in (record.part_o, record.part_d) if articulo
+        })
+
+        temporadas_existentes = set()
+        if temporadas:
+            temporadas_existentes = {fila['code_value'] for fila in self.env['code.mstr'].search_read([
                 ('code_domain', '=', 'global_domain'),
                 ('code_fldname', '=', 'TEMPORADA'),
-                ('code_value', '=', self.temporadas_id.code_value)
-            ], limit=1)
-            if not temporada_existente:
-                raise ValidationError("La temporada no existe.")
+                ('code_value', 'in', temporadas)
+            ], ['code_value'])}
+
+        articulos = {}
+        combinaciones = {}
+        estructuras = {}
+        if codigos:
+            combinaciones = self.env['copia.ficha.combinacion'].numero_combinaciones(codigos)
+            for fila in self.env['product.template'].search_read(
+                [('default_code', 'in', codigos)], ['default_code', 'pt_part_type', 'pt_pm_code']
+            ):
+                articulos.setdefault(fila['default_code'], fila)
+        if codigos and temporadas:
+            estructuras = {
+                (grupo['ps_par'], grupo['ps_ref']): grupo['__count']
+                for grupo in self.env['ps.mstr'].read_group([
+                    ('ps_domain', '=', 'global_domain'),
+                    ('ps_par', 'in', codigos),
+                    ('ps_ref', 'in', temporadas)
+                ], ['ps_par', 'ps_ref'], ['ps_par', 'ps_ref'], lazy=False)
+            }
+
+        return {
+            'temporadas': temporadas_existentes,
+            'articulos': articulos,
+            'combinaciones': combinaciones,
+            'estructuras': estructuras,
+        }
+
+    def _validar_lote(self):
+        """
+        Valida todos los registros con los mismos datos precargados.
+        Devuelve un diccionario id -> mensaje de error de los registros invalidos.
+        """
+        datos = self._datos_validacion()
+        errores = {}
+        for record in self:
+            try:
+                record._validar_copia(datos)
+            except ValidationError as e:
+                errores[record.id] = str(e)
+        return errores
+
+    def _validar_copia(self, datos=None):
+        """
+        Realiza las validaciones previas a la copia.
+        """
+        if datos is None:
+            datos = self._datos_validacion()
+        temporada = self.temporadas_id.code_value
+        part_o = self._codigo_articulo(self.part_o)
+        part_d = self._codigo_articulo(self.part_d)
+
+# Validar que la temporada exista en la base de datos.
+        if temporada not in datos['temporadas']:
+            raise ValidationError("La temporada no existe.")
 
 # Validar articulo origen.
-            if not self.part_o:
-                raise ValidationError("El articulo origen no puede estar vacío.")
-            articulo_origen = self.env['product.template'].search([('default_code', '=', self.part_o)], limit=1)
-            if not articulo_origen:
-                raise ValidationError("El articulo origen no existe.")
-            if not articulo_origen.pt_part_type.startswith("PT-"):
-                raise ValidationError("El articulo origen debe ser de tipo 'PT-'.")
-            if articulo_origen.pt_pm_code != 'M':
-                raise ValidationError("El articulo origen debe estar marcado como manufacturado.")
+        if not self.part_o:
+            raise ValidationError("El articulo origen no puede estar vacío.")
+        articulo_origen = datos['articulos'].get(part_o)
+        if not articulo_origen:
+            raise ValidationError("El articulo origen no existe.")
+        if not (articulo_origen['pt_part_type'] or '').startswith("PT-"):
+            raise ValidationError("El articulo origen debe ser de tipo 'PT-'.")
+        if articulo_origen['pt_pm_code'] != 'M':
+            raise ValidationError("El articulo origen debe estar marcado como manufacturado.")
 
 # Validar estructura para la temporada.
-            estructura_existente = self.env['ps.mstr'].search([
-                ('ps_domain', '=', 'global_domain'),
-                ('ps_ref', '=', self.temporadas_id.code_value)
-            ], limit=1)
-            if not estructura_existente:
-                raise ValidationError("El articulo origen no tiene estructura para la temporada.")
+        if not datos['estructuras'].get((part_o, temporada)):
+            raise ValidationError("El articulo origen no tiene estructura para la temporada.")
 
 # Validar articulo destino (si no es copia de número/color).
-            if self.m_numero_color:
-                if self.part_d:
-                    raise ValidationError("El articulo destino debe estar vacío cuando se copia numeraciones/ficha técnica.")
-            else:
-                if not self.part_d:
-                    raise ValidationError("El articulo destino no puede estar vacío.")
-                articulo_destino = self.env['product.template'].search([('default_code', '=', self.part_d)], limit=1)
-                if not articulo_destino:
-                    raise ValidationError("El articulo destino no existe.")
-                if not articulo_destino.pt_part_type.startswith("PT-"):
-                    raise ValidationError("El articulo destino debe ser de tipo 'PT-'.")
-                if articulo_destino.pt_pm_code != 'M':
-                    raise ValidationError("El articulo destino debe estar marcado como manufacturado.")
-                if self.part_o == self.part_d:
-                    raise ValidationError("El articulo origen y destino no pueden ser iguales.")
-                if self.m_modelo_o == self.m_modelo_d:
-                    raise ValidationError("El modelo de origen y destino deben ser diferentes.")
-
-# Validar numero de combinaciones.
-                if self.no_comb_o != self.no_comb_d:
-                    raise ValidationError("El número de combinaciones no coincide entre el articulo origen y destino.")
+        if self.m_numero_color:
+            if self.part_d:
+                raise ValidationError("El articulo destino debe estar vacío cuando se copia numeraciones/ficha técnica.")
+        else:
+            if not self.part_d:
+                raise ValidationError("El articulo destino no puede estar vacío.")
+            articulo_destino = datos['articulos'].get(part_d)
+            if not articulo_destino:
+                raise ValidationError("El articulo destino no existe.")
+            if not (articulo_destino['pt_part_type'] or '').startswith("PT-"):
+                raise ValidationError("El articulo destino debe ser de tipo 'PT-'.")
+            if articulo_destino['pt_pm_code'] != 'M':
+                raise ValidationError("El articulo destino debe estar marcado como manufacturado.")
+            if self.part_o == self.part_d:
+                raise ValidationError("El articulo origen y destino no pueden ser iguales.")
+            if self.m_modelo_o == self.m_modelo_d:
+                raise ValidationError("El modelo de origen y destino deben ser diferentes.")
+
+# Validar numero de combinaciones (del indice, no de los campos del formulario).
+            if datos['combinaciones'].get(part_o) != datos['combinaciones'].get(part_d):
+                raise ValidationError("El número de combinaciones no coincide entre el articulo origen y destino.")
 
 # Validar si el articulo destino ya tiene ficha tecnica para la temporada.
-                ficha_tecnica_existente = self.env['ps.mstr'].search([
-                    ('ps_domain', '=', 'global_domain'),
-                    ('ps_par', '=', self.part_d),
-                    ('ps_ref', '=', self.temporadas_id.code_value)
-                ], limit=1)
-                if ficha_tecnica_existente:
-                    raise ValidationError("El articulo destino ya tiene una ficha técnica para la temporada especificada.")
+            if not self.m_sincronizar and datos['estructuras'].get((part_d, temporada)):
+                raise ValidationError("El articulo destino ya tiene una ficha técnica para la temporada especificada.")
 
+    def _ejecutar_copia(self):
+        """
+        Ejecuta la copia segun el modo seleccionado. La copia de numeraciones se
+        escribe directamente por bloques de articulos, sin plan, para que la
+        memoria no crezca con la cantidad de articulos del modelo.
+        """
+        if self.m_numero_color:
+            with self._fase('copia_numero'):
+                creadas, destinos = self._copia_numero(self._codigo_articulo(self.part_o), self.temporadas_id.code_value)
+            self.env['copia.ficha.vinculo']._registrar(self, destinos)
+            return {'crear': creadas, 'actualizar': 0, 'eliminar': 0}
+        plan = self._planificar_copia()
+        with self._fase('aplicar_plan'):
+            resumen = self._aplicar_plan(plan)
+        self.env['copia.ficha.vinculo']._registrar(self, self._destinos_plan(plan))
+        return resumen
+
+    def _destinos_copia(self):
+        """
+        Articulos que la copia valida o escribe: el articulo destino y, en la
+        copia de numeraciones, los articulos del mismo modelo.
+        """
+        destinos = [self._codigo_articulo(self.part_d)] if self.part_d else []
+        if self.m_numero_color:
+            destinos += self._codigos_mismo_modelo(self._codigo_articulo(self.part_o))
+        return destinos
+
+    def _obtener_espera_bloqueo(self):
+        """
+        Segundos que una copia espera los bloqueos de sus articulos destino, desde
+        el parametro del sistema 'copia_rec_dev.espera_bloqueo' (0: no espera).
+        """
+        valor = self.env['ir.config_parameter'].sudo().get_param('copia_rec_dev.espera_bloqueo')
+        try:
+            return max(float(valor), 0)
+        except (TypeError, ValueError):
+            return ESPERA_BLOQUEO_DEFECTO
+
+    def _bloquear_destinos(self, destinos, temporada=None):
+        """
+        Toma los bloqueos consultivos de transaccion (pg_advisory_xact_lock) de
+        los articulos destino en la temporada, siempre en el mismo orden para que
+        dos copias no queden esperandose entre si. Las copias a otros articulos no
+        se bloquean; una copia a los mismos articulos espera hasta el tiempo
+        configurado y luego falla con un mensaje claro.
+        Con los bloqueos tomados se verifica que la instantanea de la
+        transaccion siga vigente para esos articulos (_verificar_destinos).
+        """
+        temporada = temporada or self.temporadas_id.code_value
+        claves = sorted({f'copia_rec_dev:{temporada}:{destino}' for destino in destinos})
+        if not claves:
+            return
+        cr = self.env.cr
+        espera = self._obtener_espera_bloqueo()
+        if not espera:
+            cr.execute("""
+                SELECT clave FROM (
+                    SELECT clave, hashtext(clave) AS llave FROM unnest(%s::text[]) AS clave ORDER BY llave
+                ) AS claves
+                WHERE NOT pg_try_advisory_xact_lock(llave)
+            """, [claves])
+            ocupados = [clave.split(':', 2)[2] for clave, in cr.fetchall()]
+            if ocupados:
+                raise UserError(
+                    f"Otra copia esta escribiendo en los articulos {', '.join(ocupados)} "
+                    f"para la temporada {temporada}. Intente nuevamente cuando termine."
+                )
+            self._verificar_destinos(destinos, temporada)
+            return
+        try:
+            with cr.savepoint(flush=False):
+                cr.execute("SELECT current_setting('lock_timeout'), set_config('lock_timeout', %s, true)", [f'{int(espera * 1000)}ms'])
+                lock_timeout = cr.fetchone()[0]
+                cr.execute("""
+                    SELECT pg_advisory_xact_lock(llave) FROM (
+                        SELECT DISTINCT hashtext(clave) AS llave FROM unnest(%s::text[]) AS clave ORDER BY llave
+                    ) AS llaves
+                """, [claves])
+                cr.execute("SELECT set_config('lock_timeout', %s, true)", [lock_timeout])
+        except errors.LockNotAvailable:
+            raise UserError(
+                f"Otra copia esta escribiendo en los articulos destino para la temporada {temporada} "
+                f"y no termino en {espera:g} s. Intente nuevamente cuando termine."
+            )
+        self._verificar_destinos(destinos, temporada)
+
+    def _verificar_destinos(self, destinos, temporada):
+        """
+        Compara las formulas de los articulos destino que ve esta transaccion con
+        las confirmadas, leidas con un cursor nuevo despues de tomar los bloqueos.
+        En REPEATABLE READ la instantanea se toma en la primera consulta: si otra
+        copia escribio en los destinos despues, la validacion veria datos viejos
+        y la copia duplicaria filas, por lo que se falla con CopiaConcurrente.
+        """
+        propias = self._huella_destinos(destinos, temporada)
+        with self.env.registry.cursor() as cr:
+            confirmadas = self._huella_destinos(destinos, temporada, cr)
+        if propias != confirmadas:
+            raise CopiaConcurrente(
+                f"Otra copia escribio en los articulos destino para la temporada {temporada} "
+                f"mientras esta esperaba. Intente nuevamente."
+            )
+
+    def _huella_destinos(self, destinos, temporada, cr=None):
+        """
+        Huella de las formulas de los articulos destino en la temporada:
+        cantidad de lineas, ultimo id y ultima write_date, leida con el cursor
+        indicado o con el del entorno.
+        """
+        cr = cr or self.env.cr
+        cr.execute(f"""
+            SELECT count(*), max(id), max(write_date)
+              FROM {self.env['ps.mstr']._table}
+             WHERE ps_domain = 'global_domain' AND ps_par = ANY(%s) AND ps_ref = %s
+        """, [sorted(set(destinos)), temporada])
+        return list(cr.fetchone())
+
+    def _huellas_plan(self, plan):
+        """
+        Estado del origen (marca de agua de copia.ficha.vinculo) y de los
+        destinos de un plan, para detectar al aplicarlo si cambiaron despues
+        de calcularlo.
+        """
+        self.env['ps.mstr'].flush_model()
+        temporada = self.temporadas_id.code_value
+        origen = self.env['copia.ficha.vinculo']._estado_origen(self._codigo_articulo(self.part_o), temporada)
+        return {
+            'origen': [origen['ult_mod_date'], origen['ult_id'], origen['ult_write_date'], origen['num_lineas_origen']],
+            'destinos': self._huella_destinos(self._destinos_plan(plan), temporada),
+        }
+
+    def _destinos_plan(self, plan):
+        """
+        Articulos destino de una copia: los del mismo modelo en la copia de
+        numeraciones o el articulo destino en la copia de color.
+        """
+        if self.m_numero_color:
+            return sorted({vals['ps_par'] for vals in plan.crear['ps.mstr']})
+        return [self._codigo_articulo(self.part_d)]
+
+    def _planificar_sincronizacion(self, vinculo, filas_origen, eliminar_sobrantes=False):
+        """
+        Plan de la sincronizacion de un vinculo: las filas origen indicadas se
+        copian al destino (con los cambios de materias primas y componentes en las
+        copias de color) y se emparejan con las lineas existentes del destino, que
+        solo se actualizan si cambian. Sin filas origen no hay materias primas ni
+        componentes que cambiar. Devuelve el plan y la cantidad de lineas que
+        tendra el destino.
+        """
+        plan = PlanCopia()
+        existentes = self._leer_filas('ps.mstr', [
+            ('ps_domain', '=', 'global_domain'),
+            ('ps_par', '=', vinculo.part_d),
+            ('ps_ref', '=', vinculo.temporada)
+        ])
+        plan.agregar_eliminacion('ps.mstr', [fila['id'] for fila in existentes])
+        plan.agregar_creacion('ps.mstr', self._clonar_filas(filas_origen, {'ps_par': vinculo.part_d}))
+        if vinculo.modo == 'color' and filas_origen:
+            self._cambia_materia(vinculo.part_o, vinculo.m_modelo_o, vinculo.part_d, vinculo.m_modelo_d, plan=plan)
+            self._cambia_componente(vinculo.part_o, vinculo.m_modelo_o, vinculo.part_d, vinculo.m_modelo_d, plan=plan)
+        conteo = plan.sincronizar(
+            'ps.mstr', existentes, CLAVE_SINCRONIZACION,
+            eliminar_sobrantes=eliminar_sobrantes, ps_par=vinculo.part_d, ps_ref=vinculo.temporada,
+        )
+        return plan, len(existentes) - conteo['eliminadas'] + conteo['insertadas']
+
+    def _planificar_copia(self):
+        """
+        Calcula el plan de la copia (filas a crear, actualizar y eliminar) sin
+        escribir en la base de datos.
+        """
+        plan = PlanCopia()
+        part_o = self._codigo_articulo(self.part_o)
+        part_d = self._codigo_articulo(self.part_d)
 # Logica de copia.
-            if self.m_numero_color:
-                self._copia_numero(self.part_o, self.temporadas_id.code_value)
-            else:
-                self._copia_color(self.part_o, self.part_d, self.temporadas_id.code_value)
-                self._cambia_materia(self.part_o, self.m_modelo_o, self.part_d, self.m_modelo_d)
-                self._cambia_componente(self.part_o, self.m_modelo_o, self.part_d, self.m_modelo_d)
+        if self.m_numero_color:
+            with self._fase('copia_numero'):
+                self._copia_numero(part_o, self.temporadas_id.code_value, plan=plan)
+        else:
+            with self._fase('copia_color'):
+                self._copia_color(part_o, part_d, self.temporadas_id.code_value, plan=plan)
+            with self._fase('cambia_materia'):
+                self._cambia_materia(part_o, self.m_modelo_o, part_d, self.m_modelo_d, plan=plan)
+            with self._fase('cambia_componente'):
+                self._cambia_componente(part_o, self.m_modelo_o, part_d, self.m_modelo_d, plan=plan)
+            if self.m_sincronizar:
+                with self._fase('sincronizacion'):
+                    self._sincronizar_formulas(plan, part_d, self.temporadas_id.code_value)
+        return plan
 
-            self.mensaje = "Proceso de copia completado correctamente."
+    def action_planificar_copia(self):
+        """
+        Modo de prueba: valida y calcula la copia sin escribir en ps.mstr/bom.mstr.
+        El plan queda guardado en el registro para aplicarlo despues.
+        """
+        self.ensure_one()
+        ficha, medidor = self._iniciar_medicion()
+        try:
+            with ficha._fase('validacion'):
+                ficha._validar_copia()
+            plan = ficha._planificar_copia()
         except ValidationError as e:
             self.mensaje = f"Error de validación: {str(e)}"
-            self.env.cr.rollback()  # Detener la operacion
-            return 
+            self._guardar_medicion(medidor, 'plan', 'error')
+            return
         except Exception as e:
             self.mensaje = f"Error inesperado: {str(e)}"
-            self.env.cr.rollback()  # Detener la operacion
-            return 
+            self._guardar_medicion(medidor, 'plan', 'error')
+            return
+        plan.fijar_huellas(ficha._huellas_plan(plan))
+        self._guardar_medicion(medidor, 'plan', 'ok')
+        resumen = plan.resumen()
+        self.write({
+            'plan_copia': plan.a_json(),
+            'mensaje': (
+                f"Plan de copia: {resumen['crear']} filas a crear, "
+                f"{resumen['actualizar']} a actualizar y {resumen['eliminar']} a eliminar."
+            ),
+        })
+
+    def action_aplicar_plan(self):
+        """
+        Aplica el plan guardado con escrituras masivas. Si la formula origen o
+        los destinos cambiaron desde que se calculo el plan, no se aplica y hay
+        que volver a planificar. Las validaciones se vuelven a ejecutar antes de escribir.
+        """
+        self.ensure_one()
+        if not self.plan_copia:
+            raise UserError("No hay un plan de copia para aplicar.")
+        ficha, medidor = self._iniciar_medicion()
+        resultado = 'error'
+        try:
+            plan = PlanCopia.desde_json(self.plan_copia)
+            with self.env.cr.savepoint():
+                ficha._bloquear_destinos(ficha._destinos_plan(plan))
+                cambiadas = plan.huellas_cambiadas(ficha._huellas_plan(plan))
+                if cambiadas:
+                    raise UserError(
+                        f"No se aplico el plan porque hubo cambios en {' y '.join(HUELLAS_PLAN[nombre] for nombre in cambiadas)} "
+                        f"desde que se calculo. Vuelva a planificar la copia."
+                    )
+                with ficha._fase('validacion'):
+                    ficha._validar_copia()
+                with ficha._fase('aplicar_plan'):
+                    resumen = ficha._aplicar_plan(plan)
+                self.env['copia.ficha.vinculo']._registrar(self, self._destinos_plan(plan))
+            resultado = 'ok'
+            self.write({
+                'plan_copia': False,
+                'mensaje': (
+                    f"Plan aplicado: {resumen['crear']} filas creadas, "
+                    f"{resumen['actualizar']} actualizadas y {resumen['eliminar']} eliminadas."
+                ),
+            })
+        except ValidationError as e:
+            self.mensaje = f"Error de validación: {str(e)}"
+            return
+        except UserError as e:
+            self.mensaje = str(e)
+            return
+        except Exception as e:
+            self.mensaje = f"Error inesperado: {str(e)}"
+            return
+        finally:
+            self._guardar_medicion(medidor, 'aplicar', resultado)
+
+    def _aplicar_plan(self, plan, tamano_lote=None):
+        """
+        Aplica un plan de copia: eliminaciones, creaciones en lotes y
+        escrituras agrupadas por valores identicos.
+        """
+        for modelo, ids in plan.eliminar.items():
+            self.env[modelo].browse(ids).unlink()
+        for modelo, vals_list in plan.crear.items():
+            self._crear_en_lotes(modelo, vals_list, tamano_lote)
+        for modelo, escrituras in plan.escribir.items():
+            self._escribir_agrupado(modelo, escrituras.items())
+        resumen = plan.resumen()
+        self._contar_filas('filas_creadas', resumen['crear'])
+        self._contar_filas('filas_escritas', resumen['actualizar'])
+        self._contar_filas('filas_eliminadas', resumen['eliminar'])
+        return resumen
+
+    @contextmanager
+    def _en_plan(self, plan, tamano_lote=None):
+        """
+        Entrega el plan recibido o, si no se recibe ninguno, uno nuevo que se
+        aplica al terminar el bloque.
+        """
+        if plan is not None:
+            yield plan
+            return
+        plan = PlanCopia()
+        yield plan
+        self._aplicar_plan(plan, tamano_lote)
 
     def obtener_numero_combinaciones(self, codigo_articulo):
         """
@@ -140,68 +693,209 @@ class CopiaFicha(models.Model):
         entre el articulo origen y el articulo destino. 
         Esta validacion es crucial para garantizar que los articulos sean compatibles 
         antes de realizar la copia.
+        El numero se lee del indice de combinaciones (copia.ficha.combinacion).
         """
-# Buscar el articulo en la base de datos.
-        articulo = self.env['product.template'].search([('default_code', '=', codigo_articulo)], limit=1)
-        
-        if not articulo:
+# Buscar el articulo en el indice de combinaciones.
+        combinaciones = self.env['copia.ficha.combinacion'].numero_combinaciones([codigo_articulo])
+
+        if codigo_articulo not in combinaciones:
             raise ValidationError(f"El articulo {codigo_articulo} no existe.")
-        
-# Suponiendo que el numero de combinaciones esta en un campo personalizado llamado 'x_numero_combinaciones'.
-        if hasattr(articulo, 'x_numero_combinaciones'):
-            return articulo.x_numero_combinaciones
-        else:
+        if not combinaciones[codigo_articulo]:
             raise ValidationError(f"El articulo {codigo_articulo} no tiene un numero de combinaciones definido.")
-           
-    def _copia_numero(self, part_o, temporadas_id):
+        return combinaciones[codigo_articulo]
+
+    @api.onchange('part_o', 'part_d')
+    def _onchange_numero_combinaciones(self):
+        combinaciones = self.env['copia.ficha.combinacion'].numero_combinaciones([
+            codigo for codigo in (self._codigo_articulo(self.part_o), self._codigo_articulo(self.part_d)) if codigo
+        ])
+        self.no_comb_o = combinaciones.get(self._codigo_articulo(self.part_o)) or False
+        self.no_comb_d = combinaciones.get(self._codigo_articulo(self.part_d)) or False
+
+    def action_buscar_destinos(self):
+        """
+        Muestra los articulos destino compatibles con el articulo origen.
+        """
+        self.ensure_one()
+        destinos = self.env['copia.ficha.combinacion'].buscar_destinos_compatibles(
+            self._codigo_articulo(self.part_o), self.temporadas_id.code_value)
+        return {
+            'type': 'ir.actions.act_window',
+            'name': "Destinos Compatibles",
+            'res_model': 'copia.ficha.combinacion',
+            'view_mode': 'tree',
+            'domain': [('id', 'in', [destino['id'] for destino in destinos])],
+            'target': 'new',
+        }
+
+    def _copia_numero(self, part_o, temporadas_id, tamano_lote=None, plan=None):
         """
         Copia las formulas de un articulo origen a otros articulos del mismo modelo.
+        Las formulas origen se leen una sola vez y los articulos destino se
+        recorren por bloques: sin plan, cada bloque se crea con creaciones
+        multiples y se libera la cache antes del siguiente. Sin plan y con el
+        motor SQL se copia con _copia_numero_sql.
+        Devuelve la cantidad de filas creadas y los articulos destino.
+        """
+        if plan is None and self._obtener_motor_copia() == 'sql':
+            return self._copia_numero_sql(part_o, temporadas_id)
+
+# Leer las formulas origen una sola vez para todo el modelo.
+        valores_origen = self._clonar_filas(self._leer_filas('ps.mstr', [
+            ('ps_domain', '=', 'global_domain'),
+            ('ps_par', '=', part_o),
+            ('ps_ref', '=', temporadas_id)
+        ]))
+
+# Cada bloque de articulos genera a lo sumo un lote de filas.
+        tamano_lote = tamano_lote or self._obtener_tamano_lote()
+        articulos_por_bloque = max(tamano_lote // max(len(valores_origen), 1), 1)
+        creadas, destinos = 0, []
+        for codigos in self._bloques_mismo_modelo(part_o, articulos_por_bloque):
+            vals_list = [dict(valores, ps_par=codigo) for codigo in codigos for valores in valores_origen]
+            if plan is not None:
+                plan.agregar_creacion('ps.mstr', vals_list)
+            else:
+                self._crear_en_lotes('ps.mstr', vals_list, tamano_lote)
+                self._contar_filas('filas_creadas', len(vals_list))
+                self._liberar_cache()
+            creadas += len(vals_list)
+            destinos += codigos
+        return creadas, destinos
+
+    def _dominio_mismo_modelo(self, part_o):
         """
-        articulo_origen = self.env['product.template'].search([('default_code', '=', part_o)], limit=1)
-        articulos_mismo_modelo = self.env['product.template'].search([
-            ('pt_model', '=', articulo_origen.pt_model),
+        Dominio de los articulos terminados del mismo modelo que el articulo origen.
+        """
+        articulo_origen = self.env['product.template'].search_read([('default_code', '=', part_o)], ['pt_model'], limit=1)
+        return [
+            ('pt_model', '=', articulo_origen[0]['pt_model'] if articulo_origen else False),
             ('pt_part_type', '=like', 'PT-%'),
             ('pt_pm_code', '=', 'M'),
             ('default_code', '!=', part_o)
-        ])
+        ]
 
-# Copiar formulas.
-        for articulo in articulos_mismo_modelo:
-            formulas_origen = self.env['ps.mstr'].search([
-                ('ps_domain', '=', 'global_domain'),
-                ('ps_par', '=', part_o),
-                ('ps_ref', '=', temporadas_id)
-            ])
-            for formula in formulas_origen:
-                self.env['ps.mstr'].create({
-                    'ps_par': articulo.default_code,
-                    'ps_comp': formula.ps_comp,
-                    'ps_ref': formula.ps_ref,
-                    'ps_qty_per': formula.ps_qty_per,
-                    'ps_scrp_pct': formula.ps_scrp_pct,
-                    'ps_ps_code': formula.ps_ps_code,
-                    'ps_lt_off': formula.ps_lt_off,
-                    'ps_start': formula.ps_start,
-                    'ps_end': formula.ps_end,
-                    'ps_rmks': formula.ps_rmks,
-                    'ps_op': formula.ps_op,
-                    'ps_item_no': formula.ps_item_no,
-                    'ps_mandatory': formula.ps_mandatory,
-                    'ps_exclusive': formula.ps_exclusive,
-                    'ps_process': formula.ps_process,
-                    'ps_qty_type': formula.ps_qty_type,
-                    'ps_user1': formula.ps_user1,
-                    'ps_user2': formula.ps_user2,
-                    'ps_fcst_pct': formula.ps_fcst_pct,
-                    'ps_default': formula.ps_default,
-                })
-
-    def _cambia_componente(self, part_o, m_modelo_o, part_d, m_modelo_d):
+    def _bloques_mismo_modelo(self, part_o, tamano_bloque):
+        """
+        Entrega los codigos de los articulos del mismo modelo en bloques de
+        'tamano_bloque', leyendo solo default_code y paginando por id.
+        """
+        dominio = self._dominio_mismo_modelo(part_o)
+        ultimo_id = 0
+        while True:
+            filas = self.env['product.template'].search_read(
+                dominio + [('id', '>', ultimo_id)], ['default_code'], order='id', limit=tamano_bloque)
+            if not filas:
+                return
+            ultimo_id = filas[-1]['id']
+            yield [fila['default_code'] for fila in filas]
+
+    def _codigos_mismo_modelo(self, part_o):
+        """
+        Codigos de todos los articulos del mismo modelo que el articulo origen.
+        """
+        return [codigo for bloque in self._bloques_mismo_modelo(part_o, TAMANO_LOTE_DEFECTO) for codigo in bloque]
+
+    def _liberar_cache(self, modelos=('ps.mstr', 'product.template')):
+        """
+        Escribe los cambios pendientes y vacia la cache del entorno de los
+        modelos copiados entre bloques.
+        """
+        self.env.flush_all()
+        for modelo in modelos:
+            self.env[modelo].invalidate_model()
+        _logger.debug("Copia por bloques: memoria residente %s KB", memoria_actual())
+
+    def _obtener_motor_copia(self):
+        """
+        Motor de las copias masivas desde el parametro del sistema
+        'copia_rec_dev.motor_copia': 'orm' (por defecto) o 'sql'.
+        """
+        motor = self.env['ir.config_parameter'].sudo().get_param('copia_rec_dev.motor_copia')
+        return 'sql' if motor == 'sql' else 'orm'
+
+    def _copia_numero_sql(self, part_o, temporadas_id):
+        """
+        Version de _copia_numero con un solo INSERT ... SELECT: las formulas
+        origen se cruzan en el servidor con los articulos del mismo modelo.
+        Devuelve la cantidad de filas creadas y los articulos destino.
+        """
+        destinos = self._codigos_mismo_modelo(part_o)
+        motor = MotorCopiaSql(self.env, 'ps.mstr', self._campos_copiables('ps.mstr'))
+        creadas = motor.copiar(
+            "CROSS JOIN unnest(%(destinos)s::varchar[]) WITH ORDINALITY AS d(codigo, orden)",
+            "o.ps_domain = 'global_domain' AND o.ps_par = %(part_o)s AND o.ps_ref = %(temporada)s",
+            {'destinos': destinos, 'part_o': part_o, 'temporada': temporadas_id},
+            expresiones={'ps_par': 'd.codigo'},
+            orden='d.orden, o.id',
+        )
+        self._contar_filas('filas_creadas', creadas)
+        return creadas, destinos
+
+    def _obtener_tamano_lote(self):
+        """
+        Obtiene el tamano de lote para las creaciones multiples desde el
+        parametro del sistema 'copia_rec_dev.tamano_lote'.
+        """
+        valor = self.env['ir.config_parameter'].sudo().get_param('copia_rec_dev.tamano_lote')
+        try:
+            return max(int(valor), 1)
+        except (TypeError, ValueError):
+            return TAMANO_LOTE_DEFECTO
+
+    def _crear_en_lotes(self, modelo, vals_list, tamano_lote=None):
+        """
+        Crea los registros de vals_list en lotes de creacion multiple.
+        """
+        tamano_lote = tamano_lote or self._obtener_tamano_lote()
+        ids_creados = []
+        for inicio in range(0, len(vals_list), tamano_lote):
+            ids_creados += self.env[modelo].create(vals_list[inicio:inicio + tamano_lote]).ids
+        return self.env[modelo].browse(ids_creados)
+
+    def _campos_copiables(self, modelo):
+        """
+        Campos almacenados del modelo que se copian al clonar sus filas,
+        obtenidos del esquema del modelo.
+        """
+        return [
+            nombre for nombre, campo in self.env[modelo]._fields.items()
+            if campo.store and campo.column_type and not campo.compute
+            and nombre not in CAMPOS_NO_COPIABLES
+        ]
+
+    def _leer_filas(self, modelo, dominio, limit=None):
+        """
+        Lee con una sola consulta las filas del dominio sobre todos los campos copiables.
+        """
+        filas = self.env[modelo].search_read(dominio, self._campos_copiables(modelo), limit=limit, load=None)
+        self._contar_filas('filas_leidas', len(filas))
+        return filas
+
+    def _clonar_filas(self, filas, sobrescribir=None):
+        """
+        Devuelve los valores de creacion de las copias de las filas leidas.
+        'sobrescribir' es un diccionario de valores fijos o una funcion que
+        recibe cada fila y devuelve los valores a cambiar (ps_par, ps_comp, ...).
+        """
+        vals_list = []
+        for fila in filas:
+            vals = {campo: valor for campo, valor in fila.items() if campo != 'id'}
+            cambios = sobrescribir(fila) if callable(sobrescribir) else sobrescribir
+            if cambios:
+                vals.update(cambios)
+            vals_list.append(vals)
+        return vals_list
+
+    def _cambia_componente(self, part_o, m_modelo_o, part_d, m_modelo_d, plan=None):
         """
         Cambia los componentes de una receta en la base de datos.
+        Las formulas destino se indexan por componente, solo se resuelve el
+        componente de la formula origen que se usa y los cambios se aplican con
+        escrituras agrupadas.
         """
 # Buscar las formulas del articulo origen.
-        ps_mstr_origin_records = self.env['ps.mstr'].search([
+        ps_mstr_origin_records = self._leer_filas('ps.mstr', [
             ('ps_domain', '=', 'global_domain'),
             ('ps_par', '=', part_o),
             ('ps_ref', '=', self.temporadas_id.code_value)
@@ -210,298 +904,453 @@ class CopiaFicha(models.Model):
         if not ps_mstr_origin_records:
             raise ValidationError(f"No se encontraron registros de origen para el articulo {part_o} y la temporada {self.temporadas_id.code_value}.")
 
+        with self._en_plan(plan) as plan:
+            self._planifica_cambio_componente(plan, ps_mstr_origin_records, m_modelo_o, part_d)
+
+    def _planifica_cambio_componente(self, plan, ps_mstr_origin_records, m_modelo_o, part_d):
+        """
+        Registra en el plan la sustitucion de componentes de las formulas destino.
+        """
 # Buscar las formulas del articulo destino.
-        ps_mstr_dest_records = self.env['ps.mstr'].search([
-            ('ps_domain', '=', 'global_domain'),
-            ('ps_par', '=', part_d),
-            ('ps_ref', '=', self.temporadas_id.code_value)
-        ])
+        ps_mstr_dest_records = plan.lineas_formula(self.env, part_d, self.temporadas_id.code_value, self._campos_copiables('ps.mstr'))
 
         if not ps_mstr_dest_records:
             raise ValidationError(f"No se encontraron registros de destino para el articulo {part_d} y la temporada {self.temporadas_id.code_value}.")
 
-# Cambiar los componentes en las formulas del articulo destino.
+# Indexar las formulas destino por componente.
+        destino_por_comp = defaultdict(list)
         for ps_dest in ps_mstr_dest_records:
-            for ps_origin in ps_mstr_origin_records:
-                if ps_dest.ps_comp == m_modelo_o:
-# Buscar un componente alternativo.
-                    nuevo_componente = self._determinar_nuevo_componente(ps_origin.ps_comp)
-                    if nuevo_componente:
-                        ps_dest.write({
-                            'ps_comp': nuevo_componente,
-                            'ps_qty_per': ps_origin.ps_qty_per,
-                            'ps_scrp_pct': ps_origin.ps_scrp_pct,
-                            'ps_ps_code': ps_origin.ps_ps_code,
-                            'ps_lt_off': ps_origin.ps_lt_off,
-                            'ps_start': ps_origin.ps_start,
-                            'ps_end': ps_origin.ps_end,
-                            'ps_rmks': ps_origin.ps_rmks,
-                            'ps_op': ps_origin.ps_op,
-                            'ps_item_no': ps_origin.ps_item_no,
-                            'ps_mandatory': ps_origin.ps_mandatory,
-                            'ps_exclusive': ps_origin.ps_exclusive,
-                            'ps_process': ps_origin.ps_process,
-                            'ps_qty_type': ps_origin.ps_qty_type,
-                            'ps_user1': ps_origin.ps_user1,
-                            'ps_user2': ps_origin.ps_user2,
-                            'ps_fcst_pct': ps_origin.ps_fcst_pct,
-                            'ps_default': ps_origin.ps_default,
-                        })
-                    else:
-                        raise ValidationError(f"No se pudo determinar un nuevo componente para {ps_origin.ps_comp}.")
-
-    def _crea_ficha_comp(self, comp_origen, comp_destino, temporadas_id):
+            destino_por_comp[ps_dest['ps_comp']].append(ps_dest)
+        lineas_a_cambiar = destino_por_comp.get(m_modelo_o)
+        if not lineas_a_cambiar:
+            return
+
+# Armar el plan de sustitucion: la primera formula origen cambia el componente de
+# la linea destino, que deja de coincidir con m_modelo_o, por lo que sus valores son
+# los que quedan. Solo si el nuevo componente vuelve a ser m_modelo_o se aplica la
+# siguiente. Solo falla si no se resuelve el componente de la formula que se usa.
+        valores = None
+        for ps_origin in ps_mstr_origin_records:
+            nuevo_componente = self._resolver_componentes([ps_origin['ps_comp']])[ps_origin['ps_comp']]
+            if not nuevo_componente:
+                raise ValidationError(f"No se pudo determinar un nuevo componente para {ps_origin['ps_comp']}.")
+            valores = {campo: ps_origin[campo] for campo in CAMPOS_CAMBIO_COMPONENTE}
+            valores['ps_comp'] = nuevo_componente
+            if nuevo_componente != m_modelo_o:
+                break
+
+# Cambiar los componentes en las formulas del articulo destino.
+        for ps_dest in lineas_a_cambiar:
+            plan.modificar_linea('ps.mstr', ps_dest, valores)
+
+    def _resolver_componentes(self, componentes):
+        """
+        Resuelve una sola vez el nuevo componente de cada componente distinto.
+        Devuelve un diccionario componente -> nuevo componente (o None).
+        """
+        pt_por_parte = self._catalogo_componentes(componentes)
+        alternativas = self._alternativas_por_grupo(self._grupos_sin_cache(pt_por_parte.values()))
+
+        return {
+            componente: (
+                self._determinar_nuevo_componente(pt_por_parte[componente], alternativas)
+                if componente in pt_por_parte else None
+            )
+            for componente in componentes
+        }
+
+    def _escribir_agrupado(self, modelo, escrituras):
+        """
+        Aplica una lista de (id, valores) con una sola escritura por cada
+        conjunto de registros que recibe valores identicos.
+        """
+        grupos = {}
+        for registro_id, valores in escrituras:
+            clave = tuple(sorted(valores.items()))
+            if clave not in grupos:
+                grupos[clave] = (valores, [])
+            grupos[clave][1].append(registro_id)
+
+        for valores, ids in grupos.values():
+            self.env[modelo].browse(ids).write(valores)
+
+    def _crea_ficha_comp(self, comp_origen, comp_destino, temporadas_id, plan=None, recursivo=False):
         """
         Crea la ficha tecnica del componente destino basada en el componente origen.
+        Con recursivo=True tambien crea las fichas de los subcomponentes que llevan
+        el numero del componente origen, en todos los niveles del arbol.
         """
-# Buscar la ficha tecnica del componente destino.
-        ps_mstr_destino = self.env['ps.mstr'].search([
-            ('ps_domain', '=', 'global_domain'),
-            ('ps_par', '=', comp_destino),
-            ('ps_ref', '=', temporadas_id)
-        ], limit=1)
+        if plan is None and self._obtener_motor_copia() == 'sql':
+            return self._crea_ficha_comp_sql(comp_origen, comp_destino, temporadas_id, recursivo)
+        with self._en_plan(plan) as plan:
+            self._planifica_ficha_comp(plan, comp_origen, comp_destino, temporadas_id, recursivo)
+
+    def _crea_ficha_comp_sql(self, comp_origen, comp_destino, temporadas_id, recursivo=False):
+        """
+        Version de _crea_ficha_comp con el motor SQL: cada nivel del arbol se
+        copia con un solo INSERT ... SELECT que renumera ps_par y ps_comp en el
+        servidor. Las cabeceras (bom.mstr) se crean con el ORM.
+        """
+        motor = MotorCopiaSql(self.env, 'ps.mstr', self._campos_copiables('ps.mstr'))
+        cabeceras = PlanCopia()
+        visitados = {comp_origen}
+        nivel = [(comp_origen, comp_destino)]
+        primer_nivel = True
+        while nivel:
+            destinos_existentes = set(self.env['ps.mstr'].search([
+                ('ps_domain', '=', 'global_domain'),
+                ('ps_par', 'in', [destino for origen, destino in nivel]),
+                ('ps_ref', '=', temporadas_id)
+            ]).mapped('ps_par'))
+            if primer_nivel and comp_destino in destinos_existentes:
+                raise ValidationError(f"La ficha técnica del componente destino {comp_destino} ya existe para la temporada {temporadas_id}.")
+            primer_nivel = False
+            nivel = [(origen, destino) for origen, destino in nivel if destino not in destinos_existentes]
+            if not nivel:
+                break
+
+# Los subcomponentes del siguiente nivel se leen antes de insertar, en el mismo orden que el ORM.
+            siguiente_nivel = []
+            if recursivo:
+                componentes_por_padre = defaultdict(list)
+                for fila in self.env['ps.mstr'].search_read([
+                    ('ps_domain', '=', 'global_domain'),
+                    ('ps_par', 'in', [origen for origen, destino in nivel]),
+                    ('ps_ref', '=', temporadas_id)
+                ], ['ps_par', 'ps_comp'], load=None):
+                    componentes_por_padre[fila['ps_par']].append(fila['ps_comp'])
+                for origen, destino in nivel:
+                    for componente in componentes_por_padre[origen]:
+                        nuevo_comp = self._renumerar_componente(componente, origen, destino)
+                        if nuevo_comp != componente and componente not in visitados:
+                            visitados.add(componente)
+                            siguiente_nivel.append((componente, nuevo_comp))
+
+            creadas = motor.copiar(
+                "JOIN unnest(%(origenes)s::varchar[], %(destinos)s::varchar[]) WITH ORDINALITY AS n(origen, destino, orden)"
+                " ON o.ps_par = n.origen",
+                "o.ps_domain = 'global_domain' AND o.ps_ref = %(temporada)s",
+                {
+                    'origenes': [origen for origen, destino in nivel],
+                    'destinos': [destino for origen, destino in nivel],
+                    'temporada': temporadas_id,
+                },
+                expresiones={'ps_par': 'n.destino', 'ps_comp': EXPRESION_RENUMERAR},
+                orden='n.orden, o.id',
+            )
+            self._contar_filas('filas_creadas', creadas)
+            self._planifica_cabeceras(cabeceras, nivel)
+            nivel = siguiente_nivel
+        self._aplicar_plan(cabeceras)
+
+    def _planifica_ficha_comp(self, plan, comp_origen, comp_destino, temporadas_id, recursivo=False):
+        """
+        Registra en el plan las filas de ps.mstr y bom.mstr del componente destino.
+        El arbol se recorre por niveles (en anchura): cada nivel se lee y se crea
+        en bloque, y los subcomponentes compartidos se procesan una sola vez.
+        """
+        visitados = {comp_origen}
+        nivel = [(comp_origen, comp_destino)]
+        primer_nivel = True
+        while nivel:
+            origenes = [origen for origen, destino in nivel]
+            destinos = [destino for origen, destino in nivel]
+
+# Buscar las fichas tecnicas de los componentes destino del nivel.
+            destinos_existentes = set(self.env['ps.mstr'].search([
+                ('ps_domain', '=', 'global_domain'),
+                ('ps_par', 'in', destinos),
+                ('ps_ref', '=', temporadas_id)
+            ]).mapped('ps_par'))
+            destinos_existentes.update(
+                vals['ps_par'] for vals in plan.creaciones('ps.mstr', ps_ref=temporadas_id)
+                if vals['ps_par'] in destinos
+            )
 
 # Si ya existe la ficha tecnica del componente destino, lanzar una excepcion.
-        if ps_mstr_destino:
-            raise ValidationError(f"La ficha técnica del componente destino {comp_destino} ya existe para la temporada {temporadas_id}.")
+# En los niveles inferiores los subcomponentes que ya existen se mantienen.
+            if primer_nivel and comp_destino in destinos_existentes:
+                raise ValidationError(f"La ficha técnica del componente destino {comp_destino} ya existe para la temporada {temporadas_id}.")
+            primer_nivel = False
+            nivel = [(origen, destino) for origen, destino in nivel if destino not in destinos_existentes]
+            if not nivel:
+                break
 
 # Si no existe la ficha tecnica del componente destino, se procede a crearla.
-        ps_mstr_origen_records = self.env['ps.mstr'].search([
-            ('ps_domain', '=', 'global_domain'),
-            ('ps_par', '=', comp_origen),
-            ('ps_ref', '=', temporadas_id)
-        ])
+            formulas_por_padre = defaultdict(list)
+            for ps_origen in self._leer_filas('ps.mstr', [
+                ('ps_domain', '=', 'global_domain'),
+                ('ps_par', 'in', [origen for origen, destino in nivel]),
+                ('ps_ref', '=', temporadas_id)
+            ]):
+                formulas_por_padre[ps_origen['ps_par']].append(ps_origen)
 
-        for ps_origen in ps_mstr_origen_records:
-# Determinar si se debe cambiar el numero del componente.
-            comp_cambia_num = (
-                ps_origen.ps_comp[-3:] == comp_origen[-3:]
-            )
-            comp_numero = comp_destino[-3:] if comp_cambia_num else ""
-
-# Crear la nueva ficha tecnica para el componente destino.
-            self.env['ps.mstr'].create({
-                'ps_par': comp_destino,
-                'ps_comp': (
-                    ps_origen.ps_comp[:-3] + comp_numero
-                    if comp_cambia_num else ps_origen.ps_comp
-                ),
-                'ps_ref': ps_origen.ps_ref,
-                'ps_qty_per': ps_origen.ps_qty_per,
-                'ps_scrp_pct': ps_origen.ps_scrp_pct,
-                'ps_ps_code': ps_origen.ps_ps_code,
-                'ps_lt_off': ps_origen.ps_lt_off,
-                'ps_start': ps_origen.ps_start,
-                'ps_end': ps_origen.ps_end,
-                'ps_rmks': ps_origen.ps_rmks,
-                'ps_op': ps_origen.ps_op,
-                'ps_item_no': ps_origen.ps_item_no,
-                'ps_mandatory': ps_origen.ps_mandatory,
-                'ps_exclusive': ps_origen.ps_exclusive,
-                'ps_process': ps_origen.ps_process,
-                'ps_qty_type': ps_origen.ps_qty_type,
-                'ps_user1': ps_origen.ps_user1,
-                'ps_user2': ps_origen.ps_user2,
-                'ps_fcst_pct': ps_origen.ps_fcst_pct,
-                'ps_default': ps_origen.ps_default,
-                'ps_group': ps_origen.ps_group,
-                'ps_critical': ps_origen.ps_critical,
-                'ps_qty_per_b': ps_origen.ps_qty_per_b,
-                'ps_comp_um': ps_origen.ps_comp_um,
-                'ps_um_conv': ps_origen.ps_um_conv,
-                'ps_assay': ps_origen.ps_assay,
-                'ps_comm_code': ps_origen.ps_comm_code,
-                'ps_non_bal': ps_origen.ps_non_bal,
-                'ps__qad01': ps_origen.ps__qad01,
-                'ps_userid': ps_origen.ps_userid,
-                'ps_mod_date': ps_origen.ps_mod_date,
-                'ps_batch_pct': ps_origen.ps_batch_pct,
-                'ps_cmtindx': ps_origen.ps_cmtindx,
-                'ps_start_ecn': ps_origen.ps_start_ecn,
-                'ps_end_ecn': ps_origen.ps_end_ecn,
-                'ps_joint_type': ps_origen.ps_joint_type,
-                'ps_cop_qty': ps_origen.ps_cop_qty,
-                'ps_cst_pct': ps_origen.ps_cst_pct,
-                'ps_prod_pct': ps_origen.ps_prod_pct,
-                'ps_qty_cons': ps_origen.ps_qty_cons,
-                'ps_qty_exch': ps_origen.ps_qty_exch,
-                'ps_qty_diag': ps_origen.ps_qty_diag,
-                'ps__chr01': ps_origen.ps__chr01,
-                'ps__chr02': ps_origen.ps__chr02,
-                'ps__dte01': ps_origen.ps__dte01,
-                'ps__dte02': ps_origen.ps__dte02,
-                'ps__dec01': ps_origen.ps__dec01,
-                'ps__dec02': ps_origen.ps__dec02,
-                'ps__log01': ps_origen.ps__log01,
-                'ps__log02': ps_origen.ps__log02,
-                'ps__qadc01': ps_origen.ps__qadc01,
-                'ps__qadc02': ps_origen.ps__qadc02,
-                'ps__qadt01': ps_origen.ps__qadt01,
-                'ps__qadt02': ps_origen.ps__qadt02,
-                'ps__qadt03': ps_origen.ps__qadt03,
-                'ps__qadd01': ps_origen.ps__qadd01,
-                'ps__qadd02': ps_origen.ps__qadd02,
-                'ps__qadl01': ps_origen.ps__qadl01,
-                'ps__qadl02': ps_origen.ps__qadl02,
-                'ps_domain': ps_origen.ps_domain,
-            })
+            vals_list = []
+            siguiente_nivel = []
+            for origen, destino in nivel:
+                for ps_origen in formulas_por_padre[origen]:
+                    nuevo_comp = self._renumerar_componente(ps_origen['ps_comp'], origen, destino)
+                    vals_list += self._clonar_filas([ps_origen], {'ps_par': destino, 'ps_comp': nuevo_comp})
+                    if recursivo and nuevo_comp != ps_origen['ps_comp'] and ps_origen['ps_comp'] not in visitados:
+                        visitados.add(ps_origen['ps_comp'])
+                        siguiente_nivel.append((ps_origen['ps_comp'], nuevo_comp))
+
+# Crear la nueva ficha tecnica de los componentes destino del nivel.
+            plan.agregar_creacion('ps.mstr', vals_list)
+            self._planifica_cabeceras(plan, nivel)
+            nivel = siguiente_nivel
 
+    def _planifica_cabeceras(self, plan, pares):
+        """
+        Registra en el plan las cabeceras (bom.mstr) de los componentes destino
+        que aun no la tienen, copiandolas de la cabecera del componente origen.
+        """
 # Crear la tabla de cabecera (bom_mstr) si no existe.
-        bom_mstr_destino = self.env['bom.mstr'].search([
+        destinos = [destino for origen, destino in pares]
+        cabeceras_existentes = set(self.env['bom.mstr'].search([
+            ('bom_domain', '=', 'global_domain'),
+            ('bom_parent', 'in', destinos)
+        ]).mapped('bom_parent'))
+        cabeceras_existentes.update(vals['bom_parent'] for vals in plan.crear['bom.mstr'])
+
+        pares = [(origen, destino) for origen, destino in pares if destino not in cabeceras_existentes]
+        if not pares:
+            return
+
+        cabeceras_origen = {}
+        for bom_mstr_origen in self._leer_filas('bom.mstr', [
             ('bom_domain', '=', 'global_domain'),
-            ('bom_parent', '=', comp_destino)
-        ], limit=1)
-
-        if not bom_mstr_destino:
-            bom_mstr_origen = self.env['bom.mstr'].search([
-                ('bom_domain', '=', 'global_domain'),
-                ('bom_parent', '=', comp_origen)
-            ], limit=1)
-
-            if bom_mstr_origen:
-                self.env['bom.mstr'].create({
-                    'bom_parent': comp_destino,
-                    'bom_desc': bom_mstr_origen.bom_desc,
-                    'bom_batch': bom_mstr_origen.bom_batch,
-                    'bom_batch_um': bom_mstr_origen.bom_batch_um,
-                    'bom_cmtindx': bom_mstr_origen.bom_cmtindx,
-                    'bom_ll_code': bom_mstr_origen.bom_ll_code,
-                    'bom_user1': bom_mstr_origen.bom_user1,
-                    'bom_user2': bom_mstr_origen.bom_user2,
-                    'bom_userid': bom_mstr_origen.bom_userid,
-                    'bom_mod_date': bom_mstr_origen.bom_mod_date,
-                    'bom__chr01': bom_mstr_origen.bom__chr01,
-                    'bom__chr02': bom_mstr_origen.bom__chr02,
-                    'bom__chr03': bom_mstr_origen.bom__chr03,
-                    'bom__chr04': bom_mstr_origen.bom__chr04,
-                    'bom__chr05': bom_mstr_origen.bom__chr05,
-                    'bom__dte01': bom_mstr_origen.bom__dte01,
-                    'bom__dte02': bom_mstr_origen.bom__dte02,
-                    'bom__dec01': bom_mstr_origen.bom__dec01,
-                    'bom__dec02': bom_mstr_origen.bom__dec02,
-                    'bom__log01': bom_mstr_origen.bom__log01,
-                    'bom_formula': bom_mstr_origen.bom_formula,
-                    'bom_mthd': bom_mstr_origen.bom_mthd,
-                    'bom_fsm_type': bom_mstr_origen.bom_fsm_type,
-                    'bom_site': bom_mstr_origen.bom_site,
-                    'bom_loc': bom_mstr_origen.bom_loc,
-                    'bom__qadc01': bom_mstr_origen.bom__qadc01,
-                    'bom__qadc02': bom_mstr_origen.bom__qadc02,
-                    'bom__qadc03': bom_mstr_origen.bom__qadc03,
-                    'bom__qadd01': bom_mstr_origen.bom__qadd01,
-                    'bom__qadi01': bom_mstr_origen.bom__qadi01,
-                    'bom__qadi02': bom_mstr_origen.bom__qadi02,
-                    'bom__qadt01': bom_mstr_origen.bom__qadt01,
-                    'bom__qadt02': bom_mstr_origen.bom__qadt02,
-                    'bom__qadl01': bom_mstr_origen.bom__qadl01,
-                    'bom__qadl02': bom_mstr_origen.bom__qadl02,
-                    'bom_mthd_qtycompl': bom_mstr_origen.bom_mthd_qtycompl,
-                    'bom_domain': bom_mstr_origen.bom_domain,
-                })
-
-    def _copia_color(self, part_o, part_d, temporadas_id): 
+            ('bom_parent', 'in', [origen for origen, destino in pares])
+        ]):
+            cabeceras_origen.setdefault(bom_mstr_origen['bom_parent'], bom_mstr_origen)
+
+        vals_list = []
+        for origen, destino in pares:
+            if origen in cabeceras_origen:
+                vals_list += self._clonar_filas([cabeceras_origen[origen]], {'bom_parent': destino})
+        plan.agregar_creacion('bom.mstr', vals_list)
+
+    def _renumerar_componente(self, componente, comp_origen, comp_destino):
+        """
+        Devuelve el componente con el numero del componente destino cuando su
+        numero (ultimos 3 caracteres) coincide con el del componente origen.
+        """
+# Determinar si se debe cambiar el numero del componente.
+        comp_cambia_num = (
+            componente[-3:] == comp_origen[-3:]
+        )
+        comp_numero = comp_destino[-3:] if comp_cambia_num else ""
+        return componente[:-3] + comp_numero if comp_cambia_num else componente
+
+    def _copia_color(self, part_o, part_d, temporadas_id, plan=None):
         """
         Copia las formulas de un articulo origen a un articulo destino.
         """
         try:
+            with self._en_plan(plan) as plan:
 # Verificar si el articulo destino ya tiene formulas, si tiene formula se eliminan.
-            formulas_existentes = self.env['ps.mstr'].search([
-                ('ps_domain', '=', 'global_domain'),
-                ('ps_par', '=', part_d),
-                ('ps_ref', '=', temporadas_id)
-            ])
-            if formulas_existentes:
-                formulas_existentes.unlink()
+                formulas_existentes = self.env['ps.mstr'].search([
+                    ('ps_domain', '=', 'global_domain'),
+                    ('ps_par', '=', part_d),
+                    ('ps_ref', '=', temporadas_id)
+                ])
+                if formulas_existentes:
+                    plan.agregar_eliminacion('ps.mstr', formulas_existentes.ids)
 
 # Copiar formulas del articulo origen al destino.
-            formulas_origen = self.env['ps.mstr'].search([
-                ('ps_domain', '=', 'global_domain'),
-                ('ps_par', '=', part_o),
-                ('ps_ref', '=', temporadas_id)
-            ])
-            for formula in formulas_origen:
-                self.env['ps.mstr'].create({
-                    'ps_par': part_d,
-                    'ps_comp': formula.ps_comp,
-                    'ps_ref': formula.ps_ref,
-                    'ps_qty_per': formula.ps_qty_per,
-                    'ps_scrp_pct': formula.ps_scrp_pct,
-                    'ps_ps_code': formula.ps_ps_code,
-                    'ps_lt_off': formula.ps_lt_off,
-                    'ps_start': formula.ps_start,
-                    'ps_end': formula.ps_end,
-                    'ps_rmks': formula.ps_rmks,
-                    'ps_op': formula.ps_op,
-                    'ps_item_no': formula.ps_item_no,
-                    'ps_mandatory': formula.ps_mandatory,
-                    'ps_exclusive': formula.ps_exclusive,
-                    'ps_process': formula.ps_process,
-                    'ps_qty_type': formula.ps_qty_type,
-                    'ps_user1': formula.ps_user1,
-                    'ps_user2': formula.ps_user2,
-                    'ps_fcst_pct': formula.ps_fcst_pct,
-                    'ps_default': formula.ps_default,
-                })
+                formulas_origen = self._leer_filas('ps.mstr', [
+                    ('ps_domain', '=', 'global_domain'),
+                    ('ps_par', '=', part_o),
+                    ('ps_ref', '=', temporadas_id)
+                ])
+                plan.agregar_creacion('ps.mstr', self._clonar_filas(formulas_origen, {'ps_par': part_d}))
         except Exception as e:
             raise ValidationError(f"Error al eliminar las fórmulas existentes: {str(e)}")
 
-    def _cambia_materia(self, part_o, m_modelo_o, part_d, m_modelo_d):
+    def _sincronizar_formulas(self, plan, part_d, temporadas_id):
         """
-        Cambia las materias primas de un articulo segun las reglas definidas.
+        Reemplaza en el plan el borrado y recreacion de las formulas destino por
+        una sincronizacion por diferencias, emparejando las lineas por
+        (ps_comp, ps_op, ps_item_no).
         """
-# Buscar las formulas del articulo destino.
-        ps_mstr_records = self.env['ps.mstr'].search([
-            ('ps_domain', '=', 'global_domain'),
+        existentes = self._leer_filas('ps.mstr', [
+            ('id', 'in', plan.eliminar['ps.mstr']),
             ('ps_par', '=', part_d),
-            ('ps_ref', '=', self.temporadas_id.code_value)
+            ('ps_ref', '=', temporadas_id),
         ])
+        return plan.sincronizar('ps.mstr', existentes, CLAVE_SINCRONIZACION, ps_par=part_d, ps_ref=temporadas_id)
+
+    def _cambia_materia(self, part_o, m_modelo_o, part_d, m_modelo_d, plan=None):
+        """
+        Cambia las materias primas de un articulo segun las reglas definidas.
+        El catalogo de componentes y sus alternativas por grupo se cargan una
+        sola vez, por lo que la cantidad de consultas no depende del largo de la receta.
+        """
+        with self._en_plan(plan) as plan:
+            self._planifica_cambio_materia(plan, part_d)
+
+    def _planifica_cambio_materia(self, plan, part_d):
+        """
+        Registra en el plan el cambio de materias primas de las formulas destino.
+        """
+# Buscar las formulas del articulo destino.
+        ps_mstr_records = plan.lineas_formula(self.env, part_d, self.temporadas_id.code_value, self._campos_copiables('ps.mstr'))
 # Validar si ps_mstr_records esta vacio.
         if not ps_mstr_records:
             raise ValidationError(f"No se encontraron registros de destino para el articulo {part_d} y la temporada {self.temporadas_id.code_value}.")
 
+# Cargar el catalogo de componentes (Tacos, Contrafuerte, Puntaduras) y sus alternativas.
+        catalogo = self._catalogo_componentes({ps_record['ps_comp'] for ps_record in ps_mstr_records}, GRUPOS_MATERIA)
+        alternativas = self._alternativas_por_grupo(self._grupos_sin_cache(catalogo.values()))
+
+        cambios = []
         for ps_record in ps_mstr_records:
-# Buscar el componente actual en pt.mstr.
-            pt_record = self.env['pt.mstr'].search([
-                ('pt_domain', '=', 'global_domain'),
-                ('pt_part', '=', ps_record.ps_comp),
-# Filtra por grupo (Tacos, Contrafuerte, Puntaduras).
-                ('pt_group', 'in', ['115', '020', '109'])
-            ], limit=1)
+# Buscar el componente actual en el catalogo.
+            pt_record = catalogo.get(ps_record['ps_comp'])
 
             if pt_record:
 # Logica para determinar el nuevo componente.
-                nuevo_componente = self._determinar_nuevo_componente(pt_record)
-                
+                nuevo_componente = self._determinar_nuevo_componente(pt_record, alternativas)
+
                 if nuevo_componente:
-# Actualizar el componente en la formula.
-                    ps_record.write({'ps_comp': nuevo_componente})
+                    cambios.append((ps_record, nuevo_componente))
                 else:
                     raise ValidationError(f"No se pudo determinar un nuevo componente para {pt_record.pt_part}.")
             else:
-                raise ValidationError(f"No se encontró el componente actual {ps_record.ps_comp} en pt.mstr.")
+                raise ValidationError(f"No se encontró el componente actual {ps_record['ps_comp']} en pt.mstr.")
 
-    def _determinar_nuevo_componente(self, pt_record):
+# Actualizar los componentes en las formulas.
+        for ps_record, nuevo_componente in cambios:
+            plan.modificar_linea('ps.mstr', ps_record, {'ps_comp': nuevo_componente})
+
+    def _catalogo_componentes(self, componentes, grupos=None):
+        """
+        Carga en una sola consulta los registros de pt.mstr de los componentes
+        indicados. Devuelve un diccionario pt_part -> pt.mstr.
+        """
+        dominio = [
+            ('pt_domain', '=', 'global_domain'),
+            ('pt_part', 'in', list(componentes)),
+        ]
+        if grupos:
+            dominio.append(('pt_group', 'in', list(grupos)))
+
+        catalogo = {}
+        for pt_record in self.env['pt.mstr'].search(dominio):
+            catalogo.setdefault(pt_record.pt_part, pt_record)
+        return catalogo
+
+    def _alternativas_por_grupo(self, grupos):
+        """
+        Precalcula los componentes alternativos de cada grupo. Basta con los dos
+        primeros componentes del grupo para obtener la alternativa de cualquier componente.
+        """
+        return {
+            grupo: self.env['pt.mstr'].search([
+                ('pt_domain', '=', 'global_domain'),
+                ('pt_group', '=', grupo),
+            ], limit=2).mapped('pt_part')
+            for grupo in grupos
+        }
+
+    def _generaciones_cache(self):
+        """
+        Devuelve las generaciones por grupo de la cache de componentes, leidas
+        una vez al iniciar la copia (contexto) o, si no hay, desde la base de datos.
+        """
+        generaciones = self.env.context.get('generaciones_cache_componentes')
+        if generaciones is None:
+            generaciones = self.env['pt.mstr']._generaciones_cache_componentes()
+        return generaciones
+
+    def _clave_cache_componente(self, pt_record, generaciones=None):
+        """
+        Clave de la cache de componentes: (base de datos, temporada, pt_group,
+        pt_part, generacion del grupo). Al cambiar pt.mstr avanza la generacion
+        de los grupos afectados, por lo que sus entradas anteriores dejan de
+        usarse en todos los procesos.
+        """
+        if generaciones is None:
+            generaciones = self._generaciones_cache()
+        return (
+            self.env.cr.dbname, self.temporadas_id.code_value, pt_record.pt_group, pt_record.pt_part,
+            generaciones.get(pt_record.pt_group, 0),
+        )
+
+    def _grupos_sin_cache(self, pt_records):
+        """
+        Devuelve los grupos que tienen al menos un componente sin resolver en la cache.
+        """
+        generaciones = self._generaciones_cache()
+        return {
+            pt_record.pt_group for pt_record in pt_records
+            if not cache_componentes.contiene(self._clave_cache_componente(pt_record, generaciones))
+        }
+
+    @api.model
+    def obtener_estadisticas_cache(self, desde=None):
+        """
+        Devuelve los aciertos y fallos de la cache de componentes de todos los
+        procesos, sumados desde copia.ficha.log (opcionalmente desde una fecha),
+        y los contadores de la cache de este proceso.
+        """
+        dominio = [('fase', '=', 'total')]
+        if desde:
+            dominio.append(('create_date', '>=', desde))
+        totales = self.env['copia.ficha.log'].sudo().read_group(dominio, ['cache_aciertos:sum', 'cache_fallos:sum'], [])[0]
+        aciertos = totales['cache_aciertos'] or 0
+        fallos = totales['cache_fallos'] or 0
+        return {
+            'aciertos': aciertos,
+            'fallos': fallos,
+            'tasa_aciertos': aciertos / (aciertos + fallos) if aciertos + fallos else 0.0,
+            'proceso': cache_componentes.estadisticas(),
+        }
+
+    @api.model
+    def _cron_compactar_cache_componentes(self):
+        """
+        Deja solo la ultima invalidacion de cada grupo de la cache de componentes.
+        """
+        self.env['pt.mstr']._compactar_generaciones_cache()
+
+    def _determinar_nuevo_componente(self, pt_record, alternativas=None):
         """
         Determina el nuevo componente basado en el componente actual.
+        El resultado se guarda en la cache de componentes de la temporada.
+        """
+        clave = self._clave_cache_componente(pt_record)
+        encontrado, nuevo_componente = cache_componentes.obtener(clave)
+        self._contar_filas('cache_aciertos' if encontrado else 'cache_fallos', 1)
+        if not encontrado:
+            nuevo_componente = self._calcular_nuevo_componente(pt_record, alternativas)
+            cache_componentes.guardar(clave, nuevo_componente)
+        return nuevo_componente
+
+    def _calcular_nuevo_componente(self, pt_record, alternativas=None):
+        """
+        Calcula el nuevo componente basado en el componente actual.
+        Si se entregan las alternativas precalculadas por grupo no se consulta pt.mstr.
         """
 # Caso 1: Buscar un componente alternativo en el mismo grupo.
-        nuevo_componente = self.env['pt.mstr'].search([
-            ('pt_domain', '=', 'global_domain'),
-            ('pt_group', '=', pt_record.pt_group),  
-            ('pt_part', '!=', pt_record.pt_part),  
-        ], limit=1)
+        if alternativas is not None and pt_record.pt_group in alternativas:
+            nuevo_componente = next(
+                (parte for parte in alternativas[pt_record.pt_group] if parte != pt_record.pt_part),
+                None,
+            )
+        else:
+            nuevo_componente = self.env['pt.mstr'].search([
+                ('pt_domain', '=', 'global_domain'),
+                ('pt_group', '=', pt_record.pt_group),
+                ('pt_part', '!=', pt_record.pt_part),
+            ], limit=1).pt_part
 
         if nuevo_componente:
-            return nuevo_componente.pt_part
+            return nuevo_componente
 
 # Caso 2: Usar un mapeo predefinido.
-        mapeo_componentes = {
-            'COMPONENTE_ANTIGUO_1': 'COMPONENTE_NUEVO_1',
-            'COMPONENTE_ANTIGUO_2': 'COMPONENTE_NUEVO_2',
-        }
-
-        if pt_record.pt_part in mapeo_componentes:
-            return mapeo_componentes[pt_record.pt_part]
+        if pt_record.pt_part in MAPEO_COMPONENTES:
+            return MAPEO_COMPONENTES[pt_record.pt_part]
 
 # Caso 3: Generar el nuevo componente.
 # Agregar un sufijo o prefijo al código original.
@@ -509,4 +1358,4 @@ class CopiaFicha(models.Model):
             return f"PT-NUEVO-{pt_record.pt_part[3:]}"
 
 # Si no se encuentra un nuevo componente, devolver None.
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,73 @@
+import cProfile
+import io
+import pstats
+import time
+from contextlib import contextmanager
+
+import psutil
+
+# Cantidad de funciones que se guardan del perfil de cada fase.
+LINEAS_PERFIL = 30
+
+# Contadores de filas que se registran por fase.
+CONTADORES_FILAS = ('filas_leidas', 'filas_creadas', 'filas_escritas', 'filas_eliminadas')
+
+# Aciertos y fallos de la cache de componentes que se registran por fase.
+CONTADORES_CACHE = ('cache_aciertos', 'cache_fallos')
+
+
+class MedidorCopia:
+    """
+    Mide las fases de una copia: duracion, consultas SQL, filas leidas,
+    creadas, escritas y eliminadas, aciertos y fallos de la cache de
+    componentes y, opcionalmente, la memoria residente que gano el proceso
+    durante la fase y un perfil cProfile.
+    """
+
+    def __init__(self, cr, perfilar=False, medir_memoria=False):
+        self.cr = cr
+        self.perfilar = perfilar
+        self.medir_memoria = medir_memoria
+        self.fases = []
+        self._actual = None
+
+    @contextmanager
+    def fase(self, nombre):
+        datos = dict.fromkeys(CONTADORES_FILAS + CONTADORES_CACHE, 0)
+        datos['fase'] = nombre
+        anterior, self._actual = self._actual, datos
+        perfil = cProfile.Profile() if self.perfilar else None
+        consultas_inicio = self.cr.sql_log_count
+        memoria_inicio = memoria_actual() if self.medir_memoria else 0
+        inicio = time.perf_counter()
+        if perfil:
+            perfil.enable()
+        try:
+            yield datos
+        finally:
+            if perfil:
+                perfil.disable()
+                salida = io.StringIO()
+                pstats.Stats(perfil, stream=salida).sort_stats('cumulative').print_stats(LINEAS_PERFIL)
+                datos['perfil'] = salida.getvalue()
+            datos['duracion'] = time.perf_counter() - inicio
+            datos['consultas'] = self.cr.sql_log_count - consultas_inicio
+            datos['memoria_maxima'] = max(memoria_actual() - memoria_inicio, 0) if self.medir_memoria else 0
+            self._actual = anterior
+            self.fases.append(datos)
+
+    def contar(self, contador, cantidad):
+        """
+        Suma filas al contador indicado de la fase en curso.
+        """
+        if self._actual is not None:
+            self._actual[contador] += cantidad
+
+
+def memoria_actual():
+    """
+    Memoria residente (RSS) del proceso en KB. No necesita activar tracemalloc
+    ni reiniciar picos compartidos, por lo que se puede leer desde varios hilos
+    a la vez; con trabajadores en paralelo la diferencia incluye la de los demas hilos.
+    """
+    return psutil.Process().memory_info().rss // 1024
@@ -0,0 +1,88 @@
+from odoo import models
+from odoo.exceptions import UserError
+
+# Renumeracion de componentes en SQL, equivalente a _renumerar_componente:
+# si el numero (ultimos 3 caracteres) del componente coincide con el del
+# componente origen se reemplaza por el numero del componente destino.
+EXPRESION_RENUMERAR = (
+    "CASE WHEN right(o.ps_comp, 3) = right(n.origen, 3)"
+    " THEN left(o.ps_comp, -3) || right(n.destino, 3)"
+    " ELSE o.ps_comp END"
+)
+
+
+class MotorCopiaSql:
+    """
+    Copia filas de un modelo con un solo INSERT ... SELECT en el servidor, sin
+    pasar las filas por Python. Las filas origen se leen con el alias 'o' y
+    'expresiones' reemplaza el valor de algunas columnas por una expresion SQL.
+    Antes de copiar se vacian las escrituras pendientes del modelo y despues se
+    invalida su cache del ORM.
+
+    El INSERT no pasa por create(): no ejecuta las sobrescrituras de create de
+    los modulos que heredan el modelo ni sus restricciones Python
+    (@api.constrains), solo las de la base de datos. Por eso el motor solo
+    acepta modelos sin ninguna de las dos.
+    """
+
+    def __init__(self, env, modelo, campos):
+        self.env = env
+        self.modelo = env[modelo]
+        self.campos = list(campos)
+        self._verificar_modelo()
+
+    def _verificar_modelo(self):
+        """
+        Falla si el modelo sobrescribe create() o tiene restricciones Python,
+        que el INSERT ... SELECT se saltaria.
+        """
+        sobrescrituras = [
+            clase.__module__ for clase in type(self.modelo).__mro__
+            if 'create' in vars(clase) and clase is not models.BaseModel
+        ]
+        if sobrescrituras:
+            raise UserError(
+                f"El motor SQL no puede copiar {self.modelo._name}: create() esta sobrescrito en "
+                f"{', '.join(sobrescrituras)}. Use copia_rec_dev.motor_copia = orm."
+            )
+        if self.modelo._constraint_methods:
+            raise UserError(
+                f"El motor SQL no puede copiar {self.modelo._name}: tiene restricciones Python "
+                f"({', '.join(metodo.__name__ for metodo in self.modelo._constraint_methods)}). "
+                f"Use copia_rec_dev.motor_copia = orm."
+            )
+
+    def copiar(self, desde, condicion, params, expresiones=None, orden='o.id'):
+        """
+        Inserta las copias de las filas 'o' de 'desde' que cumplen 'condicion'
+        y devuelve la cantidad de filas creadas.
+        """
+        expresiones = expresiones or {}
+        columnas = list(self.campos)
+        valores = [expresiones.get(campo, f'o."{campo}"') for campo in self.campos]
+        if self.modelo._log_access:
+            columnas += ['create_uid', 'create_date', 'write_uid', 'write_date']
+            valores += ['%(uid)s', "(now() at time zone 'UTC')"] * 2
+        calculados = [campo for campo in self.modelo._fields.values() if campo.store and campo.compute]
+
+        self.modelo.flush_model()
+        tabla = self.modelo._table
+        self.env.cr.execute(f"""
+            INSERT INTO "{tabla}" ({', '.join(f'"{columna}"' for columna in columnas)})
+            SELECT {', '.join(valores)}
+              FROM "{tabla}" o {desde}
+             WHERE {condicion}
+             ORDER BY {orden}
+            {'RETURNING id' if calculados else ''}
+        """, dict(params, uid=self.env.uid))
+        creadas = self.env.cr.rowcount
+        ids = [fila[0] for fila in self.env.cr.fetchall()] if calculados else []
+        self.modelo.invalidate_model()
+
+# Los campos calculados almacenados se calculan como en una creacion del ORM.
+        if ids:
+            registros = self.modelo.browse(ids)
+            for campo in calculados:
+                self.env.add_to_compute(campo, registros)
+            self.modelo.flush_model()
+        return creadas
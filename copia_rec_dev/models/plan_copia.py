@@ -0,0 +1,181 @@
+import json
+from collections import defaultdict
+from datetime import date, datetime
+
+from odoo import models, fields
+
+
+def _valor_serializable(valor):
+    """
+    Convierte un valor leido del ORM a un valor que se pueda guardar en JSON
+    y volver a entregar a create()/write().
+    """
+    if isinstance(valor, models.BaseModel):
+        return valor.id
+    if isinstance(valor, datetime):
+        return fields.Datetime.to_string(valor)
+    if isinstance(valor, date):
+        return fields.Date.to_string(valor)
+    return valor
+
+
+def _valor_huella(valor):
+    """
+    Convierte un valor de la huella del origen o de los destinos a un valor JSON
+    sin perder precision (las fechas con sus microsegundos).
+    """
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return valor
+
+
+class PlanCopia:
+    """
+    Plan de cambios de una copia de ficha tecnica: filas a crear, actualizar y
+    eliminar por modelo. Se calcula sin escribir en la base de datos y se
+    aplica despues con escrituras masivas.
+    """
+
+    def __init__(self):
+        self.crear = defaultdict(list)
+        self.escribir = defaultdict(dict)
+        self.eliminar = defaultdict(list)
+        self.huellas = {}
+
+    def fijar_huellas(self, huellas):
+        """
+        Guarda el estado del origen y de los destinos al calcular el plan
+        (nombre -> lista de valores).
+        """
+        self.huellas = {nombre: [_valor_huella(valor) for valor in valores] for nombre, valores in huellas.items()}
+
+    def huellas_cambiadas(self, huellas):
+        """
+        Devuelve los nombres de las huellas que ya no coinciden con las guardadas
+        al calcular el plan (todas si el plan no tiene huellas).
+        """
+        return [
+            nombre for nombre, valores in huellas.items()
+            if self.huellas.get(nombre) != [_valor_huella(valor) for valor in valores]
+        ]
+
+    def agregar_creacion(self, modelo, vals_list):
+        self.crear[modelo].extend(vals_list)
+
+    def agregar_eliminacion(self, modelo, ids):
+        self.eliminar[modelo].extend(ids)
+
+    def modificar_linea(self, modelo, linea, vals):
+        """
+        Modifica una linea del plan: si la linea aun no existe se cambian sus
+        valores de creacion, si existe se registra una escritura.
+        """
+        linea.update(vals)
+        if linea.get('id'):
+            self.escribir[modelo].setdefault(linea['id'], {}).update(vals)
+
+    def creaciones(self, modelo, **filtro):
+        """
+        Devuelve las filas pendientes de creacion que cumplen el filtro campo=valor.
+        """
+        return [
+            vals for vals in self.crear[modelo]
+            if all(vals.get(campo) == valor for campo, valor in filtro.items())
+        ]
+
+    def lineas_formula(self, env, par, ref, campos):
+        """
+        Devuelve las lineas de ps.mstr que tendra el articulo 'par' al aplicar el
+        plan: las existentes que no se eliminan, como diccionarios con su 'id',
+        y las pendientes de creacion.
+        """
+        lineas = env['ps.mstr'].search_read([
+            ('ps_domain', '=', 'global_domain'),
+            ('ps_par', '=', par),
+            ('ps_ref', '=', ref),
+            ('id', 'not in', self.eliminar['ps.mstr']),
+        ], campos, load=None)
+        medidor = env.context.get('medidor_copia')
+        if medidor:
+            medidor.contar('filas_leidas', len(lineas))
+        return lineas + self.creaciones('ps.mstr', ps_par=par, ps_ref=ref)
+
+    def sincronizar(self, modelo, existentes, campos_clave, eliminar_sobrantes=True, **filtro):
+        """
+        Convierte en actualizaciones las eliminaciones y creaciones del plan que
+        corresponden a la misma linea segun campos_clave: las lineas existentes
+        que coinciden se conservan y solo se escriben sus campos que cambian.
+        'existentes' son las filas leidas (con 'id') de las lineas que el plan
+        elimina y 'filtro' (campo=valor) limita las creaciones que se comparan.
+        Con eliminar_sobrantes=False las lineas existentes sin pareja se conservan.
+        Devuelve la cantidad de lineas insertadas, actualizadas, eliminadas y sin cambios.
+        """
+        por_clave = defaultdict(list)
+        for fila in existentes:
+            por_clave[tuple(fila[campo] for campo in campos_clave)].append(fila)
+
+        conservadas = set()
+        creaciones = []
+        conteo = dict.fromkeys(('insertadas', 'actualizadas', 'eliminadas', 'sin_cambios'), 0)
+        for vals in self.crear[modelo]:
+            if not all(vals.get(campo) == valor for campo, valor in filtro.items()):
+                creaciones.append(vals)
+                continue
+            candidatas = por_clave.get(tuple(vals.get(campo) for campo in campos_clave))
+            if not candidatas:
+                creaciones.append(vals)
+                conteo['insertadas'] += 1
+                continue
+            fila = candidatas.pop(0)
+            conservadas.add(fila['id'])
+            cambios = {campo: valor for campo, valor in vals.items() if fila.get(campo) != valor}
+            if cambios:
+                self.escribir[modelo].setdefault(fila['id'], {}).update(cambios)
+                conteo['actualizadas'] += 1
+            else:
+                conteo['sin_cambios'] += 1
+
+        if not eliminar_sobrantes:
+            conservadas |= {fila['id'] for fila in existentes}
+        self.crear[modelo] = creaciones
+        self.eliminar[modelo] = [registro_id for registro_id in self.eliminar[modelo] if registro_id not in conservadas]
+        conteo['eliminadas'] = len({fila['id'] for fila in existentes} - conservadas)
+        return conteo
+
+    def resumen(self):
+        return {
+            'crear': sum(len(vals_list) for vals_list in self.crear.values()),
+            'actualizar': sum(len(escrituras) for escrituras in self.escribir.values()),
+            'eliminar': sum(len(ids) for ids in self.eliminar.values()),
+        }
+
+    def a_json(self):
+        return json.dumps({
+            'crear': {
+                modelo: [{campo: _valor_serializable(valor) for campo, valor in vals.items()} for vals in vals_list]
+                for modelo, vals_list in self.crear.items()
+            },
+            'escribir': {
+                modelo: [
+                    [registro_id, {campo: _valor_serializable(valor) for campo, valor in vals.items()}]
+                    for registro_id, vals in escrituras.items()
+                ]
+                for modelo, escrituras in self.escribir.items()
+            },
+            'eliminar': dict(self.eliminar),
+            'huellas': self.huellas,
+        })
+
+    @classmethod
+    def desde_json(cls, texto):
+        datos = json.loads(texto)
+        plan = cls()
+        for modelo, vals_list in datos.get('crear', {}).items():
+            plan.agregar_creacion(modelo, vals_list)
+        for modelo, escrituras in datos.get('escribir', {}).items():
+            for registro_id, vals in escrituras:
+                plan.escribir[modelo][registro_id] = vals
+        for modelo, ids in datos.get('eliminar', {}).items():
+            plan.agregar_eliminacion(modelo, ids)
+        plan.huellas = datos.get('huellas', {})
+        return plan
@@ -0,0 +1,19 @@
+from odoo import models, api
+
+from .copia_ficha_combinacion import CAMPOS_COMBINACION
+
+
+class ProductTemplate(models.Model):
+    _inherit = 'product.template'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        registros = super(ProductTemplate, self).create(vals_list)
+        self.env['copia.ficha.combinacion']._recalcular(registros.ids)
+        return registros
+
+    def write(self, vals):
+        resultado = super(ProductTemplate, self).write(vals)
+        if CAMPOS_COMBINACION & set(vals):
+            self.env['copia.ficha.combinacion']._recalcular(self.ids)
+        return resultado
@@ -0,0 +1,96 @@
+from odoo import models, api
+
+from .componente_cache import cache_componentes
+
+# Campos de pt.mstr de los que depende la resolucion de componentes nuevos.
+CAMPOS_RESOLUCION = {'pt_domain', 'pt_group', 'pt_part'}
+
+# Tabla de invalidaciones de la cache de componentes: cada cambio inserta una fila
+# por grupo afectado y su id (de una secuencia, sin bloquear filas existentes) es la
+# nueva generacion del grupo en todos los procesos.
+TABLA_GENERACIONES = 'copia_rec_dev_cache_generacion'
+
+
+class PtMstr(models.Model):
+    _inherit = 'pt.mstr'
+
+    def init(self):
+        super(PtMstr, self).init()
+        self.env.cr.execute(f"""
+            CREATE TABLE IF NOT EXISTS {TABLA_GENERACIONES} (
+                id bigserial PRIMARY KEY,
+                grupo varchar NOT NULL,
+                fecha timestamp NOT NULL DEFAULT (now() at time zone 'UTC')
+            )
+        """)
+        self.env.cr.execute(f"CREATE INDEX IF NOT EXISTS {TABLA_GENERACIONES}_grupo_idx ON {TABLA_GENERACIONES} (grupo, id)")
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        registros = super(PtMstr, self).create(vals_list)
+        registros._invalidar_cache_componentes({
+            clave[1] for clave in registros._claves_resolucion().values() if clave[0] == 'global_domain' and clave[1]
+        })
+        return registros
+
+    def write(self, vals):
+        if not CAMPOS_RESOLUCION & set(vals):
+            return super(PtMstr, self).write(vals)
+        antes = self._claves_resolucion()
+        resultado = super(PtMstr, self).write(vals)
+        despues = self._claves_resolucion()
+# Solo los registros cuyo dominio, grupo o parte cambio afectan la resolucion.
+        grupos = set()
+        for registro_id, clave in despues.items():
+            if clave != antes[registro_id]:
+                grupos |= {
+                    grupo for dominio, grupo, parte in (antes[registro_id], clave)
+                    if dominio == 'global_domain' and grupo
+                }
+        self._invalidar_cache_componentes(grupos)
+        return resultado
+
+    def unlink(self):
+        grupos = {clave[1] for clave in self._claves_resolucion().values() if clave[0] == 'global_domain' and clave[1]}
+        resultado = super(PtMstr, self).unlink()
+        self._invalidar_cache_componentes(grupos)
+        return resultado
+
+    def _claves_resolucion(self):
+        """
+        Devuelve un diccionario id -> (pt_domain, pt_group, pt_part).
+        """
+        return {registro.id: (registro.pt_domain, registro.pt_group, registro.pt_part) for registro in self}
+
+    @api.model
+    def _generaciones_cache_componentes(self):
+        """
+        Devuelve con una sola consulta la generacion vigente de cada grupo
+        invalidado alguna vez (los demas grupos estan en la generacion 0).
+        """
+        self.env.cr.execute(f"SELECT grupo, max(id) FROM {TABLA_GENERACIONES} GROUP BY grupo")
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def _invalidar_cache_componentes(self, grupos):
+        """
+        Quita los grupos de la cache de este proceso y avanza su generacion para
+        que los demas procesos dejen de usar sus entradas. Solo inserta filas
+        nuevas, por lo que dos cambios concurrentes de pt.mstr no se bloquean.
+        """
+        if not grupos:
+            return
+        cache_componentes.invalidar(grupos)
+        self.env.cr.execute(
+            f"INSERT INTO {TABLA_GENERACIONES} (grupo) SELECT unnest(%s::varchar[])", [sorted(grupos)])
+
+    @api.model
+    def _compactar_generaciones_cache(self):
+        """
+        Borra las invalidaciones anteriores a la ultima de cada grupo.
+        """
+        self.env.cr.execute(f"""
+            DELETE FROM {TABLA_GENERACIONES} g
+             USING (SELECT grupo, max(id) AS ultima FROM {TABLA_GENERACIONES} GROUP BY grupo) u
+             WHERE g.grupo = u.grupo AND g.id < u.ultima
+        """)
@@ -1,7 +1,34 @@
-from odoo import models, fields
+from odoo import models, fields, api, tools
 
 class Receta(models.Model):
     _name = 'receta'
     _description = 'Receta'
 
     temporada_name = fields.Char(string='Nombre de Temporada', required=True)
+
+    @api.model
+    @tools.ormcache()
+    def _id_temporada_actual(self):
+        """
+        Devuelve el id de la temporada vigente (la ultima receta). El resultado
+        queda en la cache del registro y se invalida al crear o eliminar recetas.
+        """
+        return self.search([], order='id desc', limit=1).id
+
+    @api.model
+    def _temporada_actual(self):
+        """
+        Devuelve la temporada vigente (la ultima receta).
+        """
+        return self.browse(self._id_temporada_actual())
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        recetas = super(Receta, self).create(vals_list)
+        self.env.registry.clear_cache()
+        return recetas
+
+    def unlink(self):
+        resultado = super(Receta, self).unlink()
+        self.env.registry.clear_cache()
+        return resultado
@@ -0,0 +1,3 @@
+from . import test_benchmark_copia
+from . import test_motor_sql
+from . import test_sincronizacion_vinculo
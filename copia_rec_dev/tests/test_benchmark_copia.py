@@ -0,0 +1,261 @@
+import json
+import logging
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from odoo.tests import TransactionCase, tagged
+
+from ..models.medidor_copia import CONTADORES_FILAS, MedidorCopia
+from ..models.plan_copia import PlanCopia
+
+_logger = logging.getLogger(__name__)
+
+# Archivo opcional donde se guardan los resultados en JSON.
+ARCHIVO_RESULTADOS = os.environ.get('COPIA_BENCH_SALIDA')
+
+# Articulos del mismo modelo que recibe la copia de numeraciones.
+VARIANTES = 4
+
+# Presupuesto de consultas de cada fase por escala (lineas de formula del articulo origen).
+PRESUPUESTO_CONSULTAS = {
+    10: {
+        'validacion': 10,
+        'copia_numero': 18,
+        'copia_color': 13,
+        'cambia_materia': 10,
+        'cambia_componente': 12,
+        'aplicar_plan': 18,
+        'crea_ficha_comp': 28,
+        'copia_numero_sql': 12,
+        'crea_ficha_comp_sql': 25,
+    },
+    1000: {
+        'validacion': 10,
+        'copia_numero': 138,
+        'copia_color': 13,
+        'cambia_materia': 10,
+        'cambia_componente': 12,
+        'aplicar_plan': 48,
+        'crea_ficha_comp': 88,
+        'copia_numero_sql': 12,
+        'crea_ficha_comp_sql': 25,
+    },
+    100000: {
+        'validacion': 10,
+        'copia_numero': 12018,
+        'copia_color': 13,
+        'cambia_materia': 10,
+        'cambia_componente': 12,
+        'aplicar_plan': 3018,
+        'crea_ficha_comp': 6028,
+        'copia_numero_sql': 12,
+        'crea_ficha_comp_sql': 25,
+    },
+}
+
+TEMPORADA = 'BENCH'
+GRUPOS = ('115', '020', '109')
+
+
+class DatosBenchmarkCopia:
+    """
+    Datos sinteticos de ESCALA lineas de formula y medicion por fase de
+    consultas SQL, tiempo, memoria maxima y filas creadas, escritas y
+    eliminadas, con el presupuesto de consultas de la escala.
+    """
+
+    ESCALA = None
+
+    def setUp(self):
+        super().setUp()
+# Las fichas del benchmark llevan este medidor en el contexto para contar sus filas.
+        self.medidor = MedidorCopia(self.env.cr)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.resultados = []
+        cls.ficha = cls.env['copia.ficha']
+        cls.receta = cls.env['receta'].create({'temporada_name': TEMPORADA, 'code_value': TEMPORADA})
+
+    @classmethod
+    def tearDownClass(cls):
+        if ARCHIVO_RESULTADOS:
+            with open(ARCHIVO_RESULTADOS, 'w') as archivo:
+                json.dump(cls.resultados, archivo, indent=2)
+        super().tearDownClass()
+
+    def _crear_datos(self, escala):
+        """
+        Crea el articulo origen con 'escala' lineas de formula, sus variantes del
+        mismo modelo, el articulo destino, el catalogo pt.mstr y un subcomponente
+        con cabecera bom.mstr.
+        """
+        prefijo = f'BENCH{escala}'
+        ficha = self.ficha
+        componentes = [f'{prefijo}-C{numero:06d}' for numero in range(escala)]
+        ficha._crear_en_lotes('pt.mstr', [{
+            'pt_domain': 'global_domain',
+            'pt_part': componente,
+            'pt_group': GRUPOS[numero % len(GRUPOS)],
+        } for numero, componente in enumerate(componentes)])
+
+        articulos = [f'PT-{prefijo}-O'] + [f'PT-{prefijo}-V{numero}' for numero in range(VARIANTES)]
+        self.env['product.template'].create([{
+            'name': codigo,
+            'default_code': codigo,
+            'pt_model': f'M{prefijo}',
+            'pt_part_type': 'PT-BENCH',
+            'pt_pm_code': 'M',
+        } for codigo in articulos] + [{
+            'name': f'PT-{prefijo}-D',
+            'default_code': f'PT-{prefijo}-D',
+            'pt_model': f'M{prefijo}-D',
+            'pt_part_type': 'PT-BENCH',
+            'pt_pm_code': 'M',
+        }])
+
+        subcomponente = f'{prefijo}-S-001'
+        ficha._crear_en_lotes('ps.mstr', [{
+            'ps_domain': 'global_domain',
+            'ps_par': articulos[0],
+            'ps_comp': componente,
+            'ps_ref': TEMPORADA,
+            'ps_qty_per': 1.0,
+            'ps_op': 10,
+            'ps_item_no': numero,
+        } for numero, componente in enumerate(componentes)] + [{
+            'ps_domain': 'global_domain',
+            'ps_par': subcomponente,
+            'ps_comp': componente if numero % 2 else f'{componente}-001',
+            'ps_ref': TEMPORADA,
+            'ps_qty_per': 1.0,
+            'ps_op': 10,
+            'ps_item_no': numero,
+        } for numero, componente in enumerate(componentes)])
+        self.env['bom.mstr'].create({'bom_domain': 'global_domain', 'bom_parent': subcomponente})
+        self.env.flush_all()
+        return prefijo, componentes
+
+    def _crear_articulos(self, codigos):
+        """
+        Crea los cl.product.articulo de los codigos y devuelve un diccionario codigo -> registro.
+        """
+        articulo = self.env['cl.product.articulo']
+        campo = self.ficha._campo_codigo_articulo()
+        return {
+            codigo: articulo.create({campo: codigo, articulo._rec_name: codigo})
+            for codigo in codigos
+        }
+
+    @contextmanager
+    def _medir(self, escala, fase, filas=None, plan=None):
+        """
+        Mide consultas, tiempo y memoria maxima de una fase y verifica su presupuesto.
+        'filas' son las filas creadas, escritas y eliminadas esperadas (las no
+        indicadas deben ser 0): las que conto el medidor de la ficha o, si se
+        entrega 'plan', las que quedan pendientes en el plan.
+        """
+        self.env.flush_all()
+        consultas_inicio = self.env.cr.sql_log_count
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        try:
+            with self.medidor.fase(fase) as datos:
+                yield
+                self.env.flush_all()
+            duracion = time.perf_counter() - inicio
+            memoria_maxima = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        consultas = self.env.cr.sql_log_count - consultas_inicio
+
+        if filas is not None:
+            if plan is not None:
+                resumen = plan.resumen()
+                obtenidas = {
+                    'filas_creadas': resumen['crear'],
+                    'filas_escritas': resumen['actualizar'],
+                    'filas_eliminadas': resumen['eliminar'],
+                }
+            else:
+                obtenidas = {contador: datos[contador] for contador in ('filas_creadas', 'filas_escritas', 'filas_eliminadas')}
+            self.assertEqual(
+                obtenidas, dict(dict.fromkeys(obtenidas, 0), **filas),
+                f"Filas de la fase {fase} (escala {escala}).",
+            )
+
+        presupuesto = PRESUPUESTO_CONSULTAS[escala][fase]
+        resultado = {
+            'escala': escala,
+            'fase': fase,
+            'consultas': consultas,
+            'presupuesto': presupuesto,
+            'segundos': round(duracion, 4),
+            'memoria_maxima_kb': memoria_maxima // 1024,
+            **{contador: datos[contador] for contador in CONTADORES_FILAS},
+        }
+        self.resultados.append(resultado)
+        _logger.info("Benchmark copia: %s", resultado)
+        self.assertLessEqual(
+            consultas, presupuesto,
+            f"La fase {fase} (escala {escala}) uso {consultas} consultas, presupuesto {presupuesto}.",
+        )
+
+class BenchmarkCopia(DatosBenchmarkCopia):
+    """
+    Benchmark del proceso de copia: falla si una fase supera su presupuesto
+    de consultas para la escala o no crea, escribe o elimina las filas esperadas.
+    """
+
+    def test_benchmark_fases(self):
+        escala = self.ESCALA
+        prefijo, componentes = self._crear_datos(escala)
+        origen, destino = f'PT-{prefijo}-O', f'PT-{prefijo}-D'
+        articulos = self._crear_articulos([origen, destino])
+        ficha = self.ficha.new({
+            'temporadas_id': self.receta.id,
+            'part_o': articulos[origen].id,
+            'part_d': articulos[destino].id,
+            'm_modelo_o': componentes[0],
+            'm_modelo_d': f'M{prefijo}-D',
+        }).with_context(medidor_copia=self.medidor)
+
+# La validacion usa las mismas consultas para cualquier escala; solo se mide.
+        with self._medir(escala, 'validacion', filas={}):
+            ficha._validar_lote()
+
+        with self._medir(escala, 'copia_numero', filas={'filas_creadas': VARIANTES * escala}):
+            ficha._copia_numero(origen, TEMPORADA)
+
+# Las fases con plan no escriben: las filas se verifican en el plan.
+        plan = PlanCopia()
+        with self._medir(escala, 'copia_color', filas={'filas_creadas': escala}, plan=plan):
+            ficha._copia_color(origen, destino, TEMPORADA, plan=plan)
+        with self._medir(escala, 'cambia_materia', filas={'filas_creadas': escala}, plan=plan):
+            ficha._cambia_materia(origen, componentes[0], destino, f'M{prefijo}-D', plan=plan)
+        with self._medir(escala, 'cambia_componente', filas={'filas_creadas': escala}, plan=plan):
+            ficha._cambia_componente(origen, componentes[0], destino, f'M{prefijo}-D', plan=plan)
+        with self._medir(escala, 'aplicar_plan', filas={'filas_creadas': escala}):
+            ficha._aplicar_plan(plan)
+
+# Las formulas del subcomponente y su cabecera bom.mstr.
+        with self._medir(escala, 'crea_ficha_comp', filas={'filas_creadas': escala + 1}):
+            ficha._crea_ficha_comp(f'{prefijo}-S-001', f'{prefijo}-S-002', TEMPORADA, recursivo=True)
+
+
+@tagged('post_install', '-at_install', 'copia_benchmark')
+class TestBenchmarkCopia(BenchmarkCopia, TransactionCase):
+    ESCALA = 10
+
+
+@tagged('post_install', '-at_install', '-standard', 'copia_benchmark_1k')
+class TestBenchmarkCopia1k(BenchmarkCopia, TransactionCase):
+    ESCALA = 1000
+
+
+@tagged('post_install', '-at_install', '-standard', 'copia_benchmark_100k')
+class TestBenchmarkCopia100k(BenchmarkCopia, TransactionCase):
+    ESCALA = 100000
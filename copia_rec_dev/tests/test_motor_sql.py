@@ -0,0 +1,84 @@
+from collections import Counter
+
+from odoo.tests import TransactionCase, tagged
+
+from .test_benchmark_copia import TEMPORADA, VARIANTES, DatosBenchmarkCopia
+
+
+class MotorSqlCopia(DatosBenchmarkCopia):
+    """
+    Verifica que el motor SQL genera fila a fila las mismas formulas que el
+    ORM y mide sus consultas contra el presupuesto de la escala.
+    """
+
+    def _comparar_motores(self, pares, temporadas_id, copiar):
+        """
+        Ejecuta 'copiar' (funcion sin argumentos) con el motor ORM y con el motor
+        SQL, cada uno en un savepoint que se descarta, y compara fila a fila las
+        formulas resultantes de los articulos de 'pares' (sin id ni auditoria).
+        Devuelve las filas que solo genero cada motor; vacias si son identicos.
+        """
+        parametros = self.env['ir.config_parameter'].sudo()
+        motor_actual = parametros.get_param('copia_rec_dev.motor_copia')
+        campos = sorted(self.ficha._campos_copiables('ps.mstr'))
+        huellas = {}
+        try:
+            for motor in ('orm', 'sql'):
+                parametros.set_param('copia_rec_dev.motor_copia', motor)
+                savepoint = self.env.cr.savepoint()
+                try:
+                    copiar()
+                    huellas[motor] = Counter(
+                        tuple(fila[campo] for campo in campos)
+                        for fila in self.env['ps.mstr'].search_read([
+                            ('ps_domain', '=', 'global_domain'),
+                            ('ps_par', 'in', list(pares)),
+                            ('ps_ref', '=', temporadas_id)
+                        ], campos, load=None)
+                    )
+                finally:
+                    savepoint.close(rollback=True)
+        finally:
+            parametros.set_param('copia_rec_dev.motor_copia', motor_actual or False)
+        return {
+            'solo_orm': list((huellas['orm'] - huellas['sql']).elements()),
+            'solo_sql': list((huellas['sql'] - huellas['orm']).elements()),
+        }
+
+    def test_motor_sql_identico(self):
+        parametros = self.env['ir.config_parameter'].sudo()
+        escala = self.ESCALA
+        prefijo, componentes = self._crear_datos(escala)
+        ficha = self.ficha.new({'temporadas_id': self.receta.id}).with_context(medidor_copia=self.medidor)
+        origen = f'PT-{prefijo}-O'
+        variantes = [f'PT-{prefijo}-V{numero}' for numero in range(VARIANTES)]
+
+        diferencias = self._comparar_motores(
+            variantes, TEMPORADA, lambda: ficha._copia_numero(origen, TEMPORADA))
+        self.assertEqual(diferencias, {'solo_orm': [], 'solo_sql': []})
+        diferencias = self._comparar_motores(
+            [f'{prefijo}-S-002', f'{componentes[0]}-002'], TEMPORADA,
+            lambda: ficha._crea_ficha_comp(f'{prefijo}-S-001', f'{prefijo}-S-002', TEMPORADA, recursivo=True))
+        self.assertEqual(diferencias, {'solo_orm': [], 'solo_sql': []})
+
+        parametros.set_param('copia_rec_dev.motor_copia', 'sql')
+        with self._medir(escala, 'copia_numero_sql', filas={'filas_creadas': VARIANTES * escala}):
+            ficha._copia_numero(origen, TEMPORADA)
+        with self._medir(escala, 'crea_ficha_comp_sql', filas={'filas_creadas': escala + 1}):
+            ficha._crea_ficha_comp(f'{prefijo}-S-001', f'{prefijo}-S-002', TEMPORADA, recursivo=True)
+        parametros.set_param('copia_rec_dev.motor_copia', False)
+
+
+@tagged('post_install', '-at_install', 'copia_benchmark', 'copia_motor_sql')
+class TestMotorSqlCopia(MotorSqlCopia, TransactionCase):
+    ESCALA = 10
+
+
+@tagged('post_install', '-at_install', '-standard', 'copia_benchmark_1k')
+class TestMotorSqlCopia1k(MotorSqlCopia, TransactionCase):
+    ESCALA = 1000
+
+
+@tagged('post_install', '-at_install', '-standard', 'copia_benchmark_100k')
+class TestMotorSqlCopia100k(MotorSqlCopia, TransactionCase):
+    ESCALA = 100000
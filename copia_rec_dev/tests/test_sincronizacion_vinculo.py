@@ -0,0 +1,86 @@
+from odoo.tests import TransactionCase, tagged
+
+from ..models.copiaficha import CLAVE_SINCRONIZACION
+
+TEMPORADA = 'SINC'
+ORIGEN = 'PT-SINC-O'
+DESTINO = 'PT-SINC-D'
+
+
+@tagged('post_install', '-at_install', 'copia_sincronizacion')
+class TestSincronizacionVinculo(TransactionCase):
+    """
+    Verifica que la sincronizacion incremental de un vinculo cae en la
+    sincronizacion completa cuando se eliminan lineas del origen, cuando baja
+    su ultimo id y cuando cambia la clave de una linea sin tocar ps_mod_date.
+    """
+
+    def setUp(self):
+        super().setUp()
+# _verificar_destinos compara con un cursor nuevo, que debe ver la transaccion del test.
+        if self.registry.test_cr is None:
+            self.registry.enter_test_mode(self.cr)
+            self.addCleanup(self.registry.leave_test_mode)
+
+        receta = self.env['receta'].create({'temporada_name': TEMPORADA, 'code_value': TEMPORADA})
+        articulo = self.env['cl.product.articulo']
+        campo = self.env['copia.ficha']._campo_codigo_articulo()
+        origen = articulo.create({campo: ORIGEN, articulo._rec_name: ORIGEN})
+        self.ficha = self.env['copia.ficha'].create({
+            'part_o': origen.id,
+            'm_numero_color': True,
+            'temporadas_id': receta.id,
+        })
+
+        lineas = [{
+            'ps_domain': 'global_domain',
+            'ps_comp': f'SINC-C{numero}',
+            'ps_ref': TEMPORADA,
+            'ps_qty_per': 1.0,
+            'ps_op': 10,
+            'ps_item_no': numero,
+        } for numero in range(3)]
+        self.lineas_origen = self.env['ps.mstr'].create([dict(vals, ps_par=ORIGEN) for vals in lineas])
+        self.env['ps.mstr'].create([dict(vals, ps_par=DESTINO) for vals in lineas])
+        self.env.flush_all()
+# Toda la prueba corre en una transaccion con el mismo now(): atrasar la escritura
+# inicial para que las escrituras del test avancen la ultima write_date.
+        self.env.cr.execute(
+            f"UPDATE {self.env['ps.mstr']._table} SET write_date = write_date - interval '1 hour' "
+            f"WHERE ps_par IN %s AND ps_ref = %s",
+            [(ORIGEN, DESTINO), TEMPORADA])
+        self.env.invalidate_all()
+        self.env['copia.ficha.vinculo']._registrar(self.ficha, [DESTINO])
+        self.vinculo = self.env['copia.ficha.vinculo'].search([('part_o', '=', ORIGEN), ('part_d', '=', DESTINO)])
+
+    def _claves(self, articulo):
+        return sorted(
+            tuple(fila[campo] for campo in CLAVE_SINCRONIZACION)
+            for fila in self.env['ps.mstr'].search_read([
+                ('ps_domain', '=', 'global_domain'),
+                ('ps_par', '=', articulo),
+                ('ps_ref', '=', TEMPORADA),
+            ], list(CLAVE_SINCRONIZACION), load=None)
+        )
+
+    def _sincronizar_y_comparar(self):
+        self.vinculo._sincronizar_incremental()
+        claves_origen = [(DESTINO,) + clave[1:] for clave in self._claves(ORIGEN)]
+        self.assertEqual(self._claves(DESTINO), claves_origen)
+        estado = self.vinculo._estado_origen(ORIGEN, TEMPORADA)
+        self.assertEqual(self.vinculo.ult_id, estado['ult_id'])
+        self.assertEqual(self.vinculo.num_lineas_origen, estado['num_lineas_origen'])
+
+    def test_lineas_eliminadas(self):
+        self.lineas_origen[1].unlink()
+        self._sincronizar_y_comparar()
+
+    def test_ultimo_id_menor(self):
+        self.lineas_origen[-1].unlink()
+        self._sincronizar_y_comparar()
+        self.assertEqual(self.vinculo.ult_id, self.lineas_origen[1].id)
+
+    def test_clave_cambiada(self):
+        self.lineas_origen[0].write({'ps_item_no': 7})
+        self._sincronizar_y_comparar()
+        self.assertEqual(len(self._claves(DESTINO)), 3)